@@ -2,28 +2,84 @@ from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, ExpiredSignatureError
 from datetime import datetime, timedelta
-from database import DB_main as dbm
-from pwdlib import PasswordHash
+from functools import lru_cache
+import hashlib
+from database import DB_async as dba
+from database.database import get_async_session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import EmailStr
-from auth.config import settings
+from auth.config import get_settings
 from dependecies.schemas import TokenData
 from jwt.exceptions import InvalidTokenError
-
-SECRET_KEY = settings.SECRET_KEY
-ALGORITHM = settings.ALGORITHM
-ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+from auth.cache import TTLCache
+from auth.hashing import HashingPool
+from monitoring import metrics
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-pwd_hash = PasswordHash.recommended()
+# everything below is built on first use, so importing the app neither reads the env file
+# nor loads argon2
+@lru_cache
+def get_password_hash():
+    from pwdlib import PasswordHash
+    return PasswordHash.recommended()
+
+@lru_cache
+def get_hashing_pool() -> HashingPool:
+    settings = get_settings()
+    return HashingPool(workers=settings.HASH_WORKERS, max_pending=settings.HASH_MAX_PENDING)
+
+@lru_cache
+def get_user_cache() -> TTLCache:
+    settings = get_settings()
+    return TTLCache(max_size=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+# decoded tokens, keyed by the token hash so raw tokens are never kept in memory
+@lru_cache
+def get_token_cache() -> TTLCache:
+    settings = get_settings()
+    return TTLCache(max_size=settings.TOKEN_CACHE_SIZE, ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+metrics.registry.gauge("tte_hash_pending", "Password hashes queued or running", lambda: get_hashing_pool().pending)
+metrics.registry.collected_counter("tte_hash_rejected_total", "Logins turned away by hashing admission control", lambda: get_hashing_pool().rejected)
+metrics.registry.collected_counter(
+    "tte_cache_lookups_total", "Auth cache lookups",
+    lambda: {(name, result): getattr(cache, result) for name, cache in (("user", get_user_cache()), ("token", get_token_cache())) for result in ("hits", "misses")},
+    ("cache", "result"),
+)
+
+async def get_user(username: str, session: AsyncSession | None = None):
+    user = get_user_cache().get(username)
+    if user is None:
+        user = await dba.select_user_info(username, session)
+        if user is not None:
+            get_user_cache().set(username, user)
+    return user
+
+def invalidate_user(username: str):
+    get_user_cache().invalidate(username)
+
+def decode_token_username(token: str):
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    username = get_token_cache().get(token_key)
+    if username is not None:
+        return username
+    settings = get_settings()
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    username = payload.get("sub")
+    expire_time = payload.get("exp")
+    if username is not None and expire_time is not None:
+        get_token_cache().set(token_key, username, ttl=expire_time - datetime.now().timestamp())
+    return username
 
 def create_access_token(data: dict):
+    settings = get_settings()
     token_data = data.copy()
-    expire_time = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire_time = datetime.now() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     token_data.update({"exp": expire_time.timestamp()})
-    return jwt.encode(token_data, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(token_data, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
-async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_async_session)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -34,8 +90,7 @@ async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)
         if not token:
             raise credentials_exception
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
+        username = decode_token_username(token)
         if username is None:
             raise credentials_exception
         token_data = TokenData(username=username)
@@ -47,23 +102,25 @@ async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)
         )
     except InvalidTokenError:
         raise credentials_exception
-    user = dbm.select_user_info(token_data.username)
+    user = await get_user(token_data.username, session)
     if user is None:
         raise credentials_exception
     return user
 
-def authenticate_user(username: str, password: str):
-    user = dbm.select_user_info(username)
+async def authenticate_user(username: str, password: str, session: AsyncSession | None = None):
+    user = await get_user(username, session)
     if not user:
         return False
         #raise HTTPException(status_code=401, detail="Incorrect username")
-    if not pwd_hash.verify(password,user.password):
+    if not await get_hashing_pool().run(get_password_hash().verify, password, user.password):
         return False
         #raise HTTPException(status_code=401, detail="Incorrect password")
     return True
 
-def create_user(username: str, password: str, email: EmailStr = None):
-    if dbm.select_user_info(username):
+async def create_user(username: str, password: str, email: EmailStr = None, session: AsyncSession | None = None):
+    if await get_user(username, session):
         return "username is already taken"
     else:
-        return dbm.add_user(username, pwd_hash.hash(password), email)
\ No newline at end of file
+        result = await dba.add_user(username, await get_hashing_pool().run(get_password_hash().hash, password), email, session)
+        invalidate_user(username)
+        return result
\ No newline at end of file
@@ -0,0 +1,30 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from monitoring import metrics
+
+
+class HashingPool:
+    def __init__(self, workers: int = 2, max_pending: int = 32):
+        # argon2 releases the GIL while hashing, so threads give real parallelism here
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwd-hash")
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, try again later",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        timer = metrics.auth_seconds.labels(func.__name__)
+        started = timer.start()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            timer.stop(started)
+            self.pending -= 1
@@ -0,0 +1,99 @@
+"""Event-loop lag under mixed page and game database load.
+
+Simulates /account page loads (user lookup + stats lookup) interleaved
+with finished games being recorded, and samples event-loop lag while
+they run. The "sync" mode calls DB_main straight from the event loop the
+way the handlers used to, the "async" mode goes through DB_async. Uses a
+throwaway SQLite file. Run from the repository root:
+
+    python -m benchmarks.bench_db_lag --pages 2000 --games 500
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import time
+
+os.environ.setdefault("SQLITE_FILE", os.path.join(tempfile.mkdtemp(prefix="bench-db-"), "bench.db"))
+
+from benchmarks.common import sample_loop_lag, summarize_ms
+from database import DB_main as dbm
+from database import DB_async as dba
+from database.database import async_engine, create_db_and_tables
+
+game_ids = itertools.count(time.time_ns())
+
+
+def game_result(usernames: list[str], number: int) -> dict:
+    players = [usernames[(number + seat) % len(usernames)] for seat in range(4)]
+    return {"game_id": next(game_ids), "game_time": 30 + number % 60, "players": players, "winner": players[0]}
+
+
+async def page_load(mode: str, username: str):
+    if mode == "sync":
+        dbm.select_user_info(username)
+        dbm.select_user_stats(username)
+        await asyncio.sleep(0)
+    else:
+        await dba.select_user_info(username)
+        await dba.select_user_stats(username)
+
+
+async def record_game(mode: str, result: dict):
+    if mode == "sync":
+        dbm.add_game_results([result])
+        await asyncio.sleep(0)
+    else:
+        await dba.add_game_results([result])
+
+
+async def run(mode: str, usernames: list[str], pages: int, games: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(coroutine):
+        async with semaphore:
+            await coroutine
+
+    work = [limited(page_load(mode, usernames[number % len(usernames)])) for number in range(pages)]
+    work += [limited(record_game(mode, game_result(usernames, number))) for number in range(games)]
+    lags: list[float] = []
+    sampler = asyncio.create_task(sample_loop_lag(lags, interval=0.005))
+    started = time.perf_counter()
+    await asyncio.gather(*work)
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+    return {
+        "mode": mode,
+        "pages": pages,
+        "games": games,
+        "seconds": elapsed,
+        "operations_per_second": (pages + games) / elapsed,
+        "loop_lag": summarize_ms(lags),
+    }
+
+
+async def main_async(args) -> list[dict]:
+    create_db_and_tables()
+    usernames = [f"bench-user-{number}" for number in range(args.users)]
+    for username in usernames:
+        if dbm.select_user_info(username) is None:
+            dbm.add_user(username, "not-a-real-hash")
+    results = [await run(mode, usernames, args.pages, args.games, args.concurrency) for mode in ("sync", "async")]
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
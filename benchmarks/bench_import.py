@@ -0,0 +1,72 @@
+"""Import-time profile of the app.
+
+Imports each module in a fresh interpreter, reports the median wall time
+over several runs, and breaks one run down with `python -X importtime`
+into the slowest modules and the total per top-level package. Run from
+the repository root:
+
+    python -m benchmarks.bench_import --runs 5 --top 15
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+TIMED_IMPORT = "import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+
+
+def timed_import(module: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", TIMED_IMPORT.format(module=module)], capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def import_profile(module: str) -> list[tuple[str, int, int]]:
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module: str, runs: int, top: int) -> dict:
+    times = [timed_import(module) for _ in range(runs)]
+    profile = import_profile(module)
+    packages: dict[str, int] = defaultdict(int)
+    for name, self_us, _ in profile:
+        packages[name.split(".")[0]] += self_us
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": statistics.median(times) * 1000,
+        "min_ms": min(times) * 1000,
+        "modules_imported": len(profile),
+        "slowest_modules": [
+            {"module": name, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000}
+            for name, self_us, cumulative_us in sorted(profile, key=lambda row: row[1], reverse=True)[:top]
+        ],
+        "packages_ms": {
+            name: total / 1000 for name, total in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=["main", "game.websocket_handlers", "auth.auth", "database.DB_async"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    print(json.dumps([measure(module, args.runs, args.top) for module in args.modules], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Concurrent logins vs. event loop responsiveness.
+
+Runs bursts of password verifications while a fake game loop ticks every
+10 ms, once hashing inline on the event loop and once through the
+hashing pool. Run from the repository root:
+
+    python -m benchmarks.bench_login --logins 64 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import time
+from auth.auth import get_password_hash
+from auth.hashing import HashingPool
+from benchmarks.common import sample_loop_lag, summarize_ms
+from fastapi import HTTPException
+
+
+async def run(mode: str, logins: int, concurrency: int, workers: int, max_pending: int) -> dict:
+    pwd_hash = get_password_hash()
+    password_hash = pwd_hash.hash("benchmark-password")
+    pool = HashingPool(workers=workers, max_pending=max_pending)
+    semaphore = asyncio.Semaphore(concurrency)
+    rejected = 0
+
+    async def login():
+        nonlocal rejected
+        async with semaphore:
+            if mode == "inline":
+                pwd_hash.verify("benchmark-password", password_hash)
+                await asyncio.sleep(0)
+                return
+            try:
+                await pool.run(pwd_hash.verify, "benchmark-password", password_hash)
+            except HTTPException:
+                rejected += 1
+
+    lags: list[float] = []
+    ticker = asyncio.create_task(sample_loop_lag(lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    ticker.cancel()
+    pool.executor.shutdown()
+    return {
+        "mode": mode,
+        "logins": logins,
+        "concurrency": concurrency,
+        "workers": workers,
+        "rejected": rejected,
+        "seconds": elapsed,
+        "logins_per_second": (logins - rejected) / elapsed,
+        "loop_lag": summarize_ms(lags),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-pending", type=int, default=32)
+    args = parser.parse_args()
+    results = [
+        asyncio.run(run(mode, args.logins, args.concurrency, args.workers, args.max_pending))
+        for mode in ("inline", "pool")
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
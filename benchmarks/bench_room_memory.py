@@ -0,0 +1,82 @@
+"""Memory held by idle rooms.
+
+Builds N rooms of idle players with the RoomState layout and with the
+five parallel dicts ConnectionManager used before, and reports the bytes
+each costs per room. Run from the repository root:
+
+    python -m benchmarks.bench_room_memory --rooms 10000 --players 4
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from game.room_state import RoomState
+
+
+class IdleConnection:
+    __slots__ = ()
+
+    def push(self, message: str) -> bool:
+        return True
+
+    def close(self, code: int | None = None):
+        pass
+
+
+def build_room_states(rooms: int, players: int, connection: IdleConnection):
+    states = {}
+    for room_number in range(rooms):
+        room = RoomState(f"room-{room_number}", max_players=players, track_length=15)
+        for seat in range(players):
+            room.add_player(f"player-{room_number}-{seat}", connection)
+        room.turn_index = 0
+        states[room.room_id] = room
+    return states
+
+
+def build_parallel_dicts(rooms: int, players: int, connection: IdleConnection):
+    active_connections, room_config, ready, positions, current_turn = {}, {}, {}, {}, {}
+    for room_number in range(rooms):
+        room_id = f"room-{room_number}"
+        room_config[room_id] = {"max_players": players, "track_length": 15, "start_time": 0}
+        active_connections[room_id] = {}
+        ready[room_id] = {}
+        positions[room_id] = {}
+        for seat in range(players):
+            username = f"player-{room_number}-{seat}"
+            active_connections[room_id][username] = connection
+            ready[room_id][username] = False
+            positions[room_id][username] = 0
+        current_turn[room_id] = f"player-{room_number}-0"
+    return active_connections, room_config, ready, positions, current_turn
+
+
+def measure(builder, rooms: int, players: int) -> dict:
+    connection = IdleConnection()
+    gc.collect()
+    tracemalloc.start()
+    state = builder(rooms, players, connection)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+    return {
+        "layout": builder.__name__.removeprefix("build_"),
+        "rooms": rooms,
+        "players_per_room": players,
+        "bytes": current,
+        "peak_bytes": peak,
+        "bytes_per_room": current / rooms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=4)
+    args = parser.parse_args()
+    results = [measure(builder, args.rooms, args.players) for builder in (build_parallel_dicts, build_room_states)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
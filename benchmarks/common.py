@@ -0,0 +1,26 @@
+import asyncio
+import statistics
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize_ms(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50_ms": statistics.median(values) * 1000 if values else 0.0,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": max(values, default=0.0) * 1000,
+    }
+
+
+async def sample_loop_lag(lags: list[float], interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
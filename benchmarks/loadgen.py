@@ -0,0 +1,230 @@
+"""Load generator for the WebSocket game loop.
+
+Starts the app locally (benchmarks/serve.py), registers and logs in a
+pool of users, then for every concurrency level creates that many rooms
+through /create_room and plays each one over /ws/{room_id}/{username}
+(ready toggles, ROLL_DICE until WIN). Reports message throughput,
+broadcast latency, server event-loop lag and server memory per room,
+and saves everything as JSON so runs can be compared between commits:
+
+    python -m benchmarks.loadgen --rooms 10 100 1000 --output loadgen.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+import websockets
+from benchmarks.common import summarize_ms
+
+PASSWORD = "loadgen-password"
+
+
+class RoomRun:
+    def __init__(self, room_id: str, players: list[str]):
+        self.room_id = room_id
+        self.players = players
+        self.rolled_at = 0.0
+        self.finished = asyncio.Event()
+
+
+class Results:
+    def __init__(self):
+        self.messages = 0
+        self.frames = 0
+        self.bytes = 0
+        self.latencies: list[float] = []
+        self.games = 0
+        self.failed = 0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def decode(frame: str, protocol: str) -> list[tuple[str, str]]:
+    if protocol == "v2":
+        codes = {"start": "GAME_START", "turn": "TURN_CHANGE", "win": "WIN"}
+        return [(codes.get(kind, kind), payload) for kind, payload in json.loads(frame)]
+    kind, _, payload = frame.partition(":")
+    return [(kind, payload)]
+
+
+async def start_server(port: int, lag_file: str) -> subprocess.Popen:
+    # the accounts and games of a run go to a throwaway database, not the developer's one
+    env = dict(os.environ)
+    env.setdefault("SQLITE_FILE", os.path.join(tempfile.mkdtemp(prefix="loadgen-db-"), "loadgen.db"))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.serve", "--port", str(port), "--lag-file", lag_file], env=env
+    )
+    async with httpx.AsyncClient() as client:
+        for _ in range(200):
+            try:
+                await client.get(f"http://127.0.0.1:{port}/")
+                return process
+            except httpx.TransportError:
+                await asyncio.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("server did not start")
+
+
+async def prepare_users(base_url: str, count: int, prefix: str) -> list[str]:
+    users = [f"{prefix}{number}" for number in range(count)]
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        for username in users:
+            await client.post("/register", data={
+                "register_username": username,
+                "register_password": PASSWORD,
+                "register_confirm_password": PASSWORD,
+            })
+            response = await client.post("/token", data={"username": username, "password": PASSWORD})
+            if "access_token" not in response.cookies:
+                raise RuntimeError(f"could not log in as {username}")
+    return users
+
+
+async def play_player(ws_url: str, room: RoomRun, username: str, protocol: str, results: Results, connected: asyncio.Barrier):
+    subprotocols = ["tte.v2"] if protocol == "v2" else None
+    async with websockets.connect(f"{ws_url}/ws/{room.room_id}/{username}", subprotocols=subprotocols, max_queue=None) as websocket:
+        await connected.wait()
+        await websocket.send("READY_TOGGLE")
+        while not room.finished.is_set():
+            frame = await websocket.recv()
+            received_at = time.perf_counter()
+            results.frames += 1
+            results.bytes += len(frame)
+            for kind, payload in decode(frame, protocol):
+                results.messages += 1
+                if kind in ("TURN_CHANGE", "WIN") and room.rolled_at:
+                    results.latencies.append(received_at - room.rolled_at)
+                if kind == "WIN":
+                    room.finished.set()
+                elif kind in ("GAME_START", "TURN_CHANGE") and payload == username:
+                    room.rolled_at = time.perf_counter()
+                    await websocket.send("ROLL_DICE")
+
+
+async def play_room(ws_url: str, room: RoomRun, protocol: str, results: Results, timeout: float):
+    connected = asyncio.Barrier(len(room.players))
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(play_player(ws_url, room, username, protocol, results, connected) for username in room.players)),
+            timeout,
+        )
+        results.games += 1
+    except Exception:
+        results.failed += 1
+
+
+async def run_level(args, rooms: int, users: list[str], base_url: str, ws_url: str, process: subprocess.Popen, level_lag_file: str) -> dict:
+    results = Results()
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        room_runs = []
+        for number in range(rooms):
+            room_id = f"load-{rooms}-{number}"
+            await client.post("/create_room", data={"input_room_name": room_id, "input_max_players": str(args.players)})
+            players = [users[(number + seat) % len(users)] for seat in range(args.players)]
+            room_runs.append(RoomRun(room_id, players))
+
+    baseline_rss = rss_bytes(process.pid)
+    peak_rss = baseline_rss
+
+    async def sample_memory():
+        nonlocal peak_rss
+        while True:
+            peak_rss = max(peak_rss, rss_bytes(process.pid))
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.create_task(sample_memory())
+    started = time.perf_counter()
+    await asyncio.gather(*(play_room(ws_url, room, args.protocol, results, args.timeout) for room in room_runs))
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+
+    return {
+        "rooms": rooms,
+        "players_per_room": args.players,
+        "protocol": args.protocol,
+        "games_finished": results.games,
+        "games_failed": results.failed,
+        "seconds": elapsed,
+        "messages": results.messages,
+        "frames": results.frames,
+        "bytes": results.bytes,
+        "messages_per_second": results.messages / elapsed,
+        "frames_per_second": results.frames / elapsed,
+        "broadcast_latency": summarize_ms(results.latencies),
+        "server_rss_baseline_bytes": baseline_rss,
+        "server_rss_peak_bytes": peak_rss,
+        "server_bytes_per_room": (peak_rss - baseline_rss) / rooms,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    raise_fd_limit()
+    levels = []
+    for rooms in args.rooms:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        ws_url = f"ws://127.0.0.1:{port}"
+        lag_file = os.path.join(tempfile.gettempdir(), f"loadgen-lag-{port}.json")
+        process = await start_server(port, lag_file)
+        try:
+            users = await prepare_users(base_url, max(args.users, args.players), f"load{port}u")
+            level = await run_level(args, rooms, users, base_url, ws_url, process, lag_file)
+        finally:
+            process.terminate()
+            process.wait()
+        with open(lag_file) as file:
+            level["server_loop_lag"] = json.load(file)
+        os.remove(lag_file)
+        levels.append(level)
+        print(json.dumps(level), file=sys.stderr)
+    return {"commit": git_commit(), "started_at": time.time(), "levels": levels}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--users", type=int, default=4, help="accounts registered and logged in before each level")
+    parser.add_argument("--protocol", choices=["text", "v2"], default="text")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds a single room may take to finish")
+    parser.add_argument("--output", default="loadgen_results.json")
+    args = parser.parse_args()
+    results = asyncio.run(run(args))
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Runs the app under uvicorn and records the server's event-loop lag.
+
+Started by benchmarks/loadgen.py, the lag summary is written to --lag-file
+when the server shuts down.
+"""
+import argparse
+import asyncio
+import json
+import signal
+import uvicorn
+from benchmarks.common import sample_loop_lag, summarize_ms
+
+
+async def serve(port: int, lag_file: str):
+    server = uvicorn.Server(uvicorn.Config("main:app", host="127.0.0.1", port=port, log_level="warning"))
+    lags: list[float] = []
+    sampler = asyncio.create_task(sample_loop_lag(lags))
+    try:
+        await server.serve()
+    finally:
+        sampler.cancel()
+        with open(lag_file, "w") as file:
+            json.dump(summarize_ms(lags), file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--lag-file", required=True)
+    args = parser.parse_args()
+    # uvicorn re-raises the signal it shut down on once it restores this handler, keep it
+    # harmless so the lag summary still gets written
+    signal.signal(signal.SIGTERM, lambda signum, frame: None)
+    asyncio.run(serve(args.port, args.lag_file))
+
+
+if __name__ == "__main__":
+    main()
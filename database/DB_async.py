@@ -0,0 +1,95 @@
+from pydantic import EmailStr
+from sqlmodel import select, func, insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database.database import async_session_scope
+from database.models import Users, Games, GameUsers, UserStats
+from database.DB_main import (
+    game_result_rows, user_stats_rows, insert_missing_user_stats, increment_user_stats, leaderboard_statement, leaderboard_rows, match_history_statement, match_history_rows
+)
+from monitoring.metrics import timed, db_seconds
+
+@timed(db_seconds)
+async def add_user(username: str, password: str, email: EmailStr = None, session: AsyncSession | None = None):
+    async with async_session_scope(session) as session:
+        user = Users(username=username, password=password, email=email)
+        session.add(user)
+        await session.commit()
+    return "user added"
+
+@timed(db_seconds)
+async def add_game(game_id: int, game_time: int, player_count: int):
+    async with async_session_scope() as session:
+        game = Games(id=game_id, game_time=game_time, player_count=player_count)
+        session.add(game)
+        await session.commit()
+    return "game added"
+
+@timed(db_seconds)
+async def add_game_user(game_id: int, user_id: str, winner: bool):
+    async with async_session_scope() as session:
+        game_user = GameUsers(game_id=game_id, user_id=user_id, winner=winner)
+        session.add(game_user)
+        game = await session.get(Games, game_id)
+        await _add_to_user_stats(session, [(user_id, winner, game.game_time if game else 0)])
+        await session.commit()
+    return "gameuser added"
+
+@timed(db_seconds)
+async def add_game_results(results: list[dict]):
+    if not results:
+        return "no games to add"
+    game_rows, game_user_rows, stats_entries = game_result_rows(results)
+    async with async_session_scope() as session:
+        await session.exec(insert(Games), params=game_rows)
+        if game_user_rows:
+            await session.exec(insert(GameUsers), params=game_user_rows)
+        await _add_to_user_stats(session, stats_entries)
+        await session.commit()
+    return "games added"
+
+async def _add_to_user_stats(session: AsyncSession, entries: list[tuple[str, bool, float]]):
+    rows = user_stats_rows(entries)
+    if not rows:
+        return
+    await session.exec(insert_missing_user_stats, params=[{"username": row["b_username"]} for row in rows])
+    await session.exec(increment_user_stats, params=rows)
+
+@timed(db_seconds)
+async def select_user_info(username: str, session: AsyncSession | None = None):
+    async with async_session_scope(session) as session:
+        statement = select(Users).where(Users.username == username)
+        result = (await session.exec(statement)).first()
+    return result
+
+@timed(db_seconds)
+async def select_game_count_by_username(username: str, session: AsyncSession | None = None):
+    async with async_session_scope(session) as session:
+        statement = select(func.count(GameUsers.game_id)).where(GameUsers.user_id == username)
+        return (await session.exec(statement)).first()
+
+@timed(db_seconds)
+async def select_won_games_count_by_username(username: str, session: AsyncSession | None = None):
+    async with async_session_scope(session) as session:
+        statement = select(func.count(GameUsers.game_id)).where(GameUsers.user_id == username, GameUsers.winner == True)
+        return (await session.exec(statement)).first()
+
+@timed(db_seconds)
+async def select_mean_game_time_by_username(username: str, session: AsyncSession | None = None):
+    async with async_session_scope(session) as session:
+        statement = select(func.avg(Games.game_time)).select_from(Games).join(GameUsers, Games.id == GameUsers.game_id).where(GameUsers.user_id == username)
+        return (await session.exec(statement)).first()
+
+@timed(db_seconds)
+async def select_user_stats(username: str, session: AsyncSession | None = None):
+    async with async_session_scope(session) as session:
+        return await session.get(UserStats, username)
+
+@timed(db_seconds)
+async def select_leaderboard(metric: str, after: tuple | None = None, limit: int = 20, min_games: int = 1, session: AsyncSession | None = None):
+    async with async_session_scope(session) as session:
+        return leaderboard_rows(await session.exec(leaderboard_statement(metric, after, limit, min_games)))
+
+@timed(db_seconds)
+async def select_match_history(username: str, before: int | None = None, limit: int = 20, session: AsyncSession | None = None):
+    async with async_session_scope(session) as session:
+        return match_history_rows(await session.exec(match_history_statement(username, before, limit)))
@@ -1,15 +1,20 @@
 from pydantic import EmailStr
-from sqlmodel import Session, select, func
-from database.database import engine, create_db_and_tables
-from database.models import Users, Games, GameUsers
+from sqlmodel import Session, select, func, insert, update, delete, case, or_, and_
+from sqlalchemy import bindparam
+from datetime import datetime
+from database.database import engine, session_scope
+from database.models import Users, Games, GameUsers, UserStats
+from monitoring.metrics import timed, db_seconds
 
-def add_user(username: str, password: str, email: EmailStr = None):
-    with Session(engine) as session:
+@timed(db_seconds)
+def add_user(username: str, password: str, email: EmailStr = None, session: Session | None = None):
+    with session_scope(session) as session:
         user = Users(username=username, password=password, email=email)
         session.add(user)
         session.commit()
     return "user added"
 
+@timed(db_seconds)
 def add_game(game_id: int, game_time: int, player_count: int):
     with Session(engine) as session:
         game = Games(id=game_id, game_time=game_time, player_count=player_count)
@@ -17,35 +22,193 @@ def add_game(game_id: int, game_time: int, player_count: int):
         session.commit()
     return "game added"
 
+@timed(db_seconds)
 def add_game_user(game_id: int, user_id: str, winner: bool):
     with Session(engine) as session:
         game_user = GameUsers(game_id=game_id, user_id=user_id, winner=winner)
         session.add(game_user)
+        game = session.get(Games, game_id)
+        _add_to_user_stats(session, [(user_id, winner, game.game_time if game else 0)])
         session.commit()
     return "gameuser added"
 
-def select_user_info(username: str):
+@timed(db_seconds)
+def add_game_results(results: list[dict]):
+    if not results:
+        return "no games to add"
+    game_rows, game_user_rows, stats_entries = game_result_rows(results)
     with Session(engine) as session:
+        session.exec(insert(Games), params=game_rows)
+        if game_user_rows:
+            session.exec(insert(GameUsers), params=game_user_rows)
+        _add_to_user_stats(session, stats_entries)
+        session.commit()
+    return "games added"
+
+def _add_to_user_stats(session: Session, entries: list[tuple[str, bool, float]]):
+    rows = user_stats_rows(entries)
+    if not rows:
+        return
+    session.exec(insert_missing_user_stats, params=[{"username": row["b_username"]} for row in rows])
+    session.exec(increment_user_stats, params=rows)
+
+def game_result_rows(results: list[dict]):
+    game_rows = [
+        {"id": result["game_id"], "game_time": result["game_time"], "player_count": len(result["players"])}
+        for result in results
+    ]
+    game_user_rows = [
+        {"game_id": result["game_id"], "user_id": username, "winner": username == result["winner"]}
+        for result in results
+        for username in result["players"]
+    ]
+    stats_entries = [
+        (username, username == result["winner"], result["game_time"])
+        for result in results
+        for username in result["players"]
+    ]
+    return game_rows, game_user_rows, stats_entries
+
+# the counters are only ever added to in the database, two workers recording games of the same
+# player at once both count instead of one overwriting the other
+insert_missing_user_stats = (
+    insert(UserStats.__table__)
+    .prefix_with("OR IGNORE", dialect="sqlite")
+    .prefix_with("IGNORE", dialect="mysql")
+)
+increment_user_stats = (
+    update(UserStats.__table__)
+    .where(UserStats.__table__.c.username == bindparam("b_username"))
+    .values(
+        games=UserStats.__table__.c.games + bindparam("b_games"),
+        wins=UserStats.__table__.c.wins + bindparam("b_wins"),
+        total_game_time=UserStats.__table__.c.total_game_time + bindparam("b_total_game_time"),
+        updated_at=bindparam("b_updated_at"),
+    )
+)
+
+def user_stats_rows(entries: list[tuple[str, bool, float]]) -> list[dict]:
+    now = datetime.now()
+    rows = {}
+    for username, won, game_time in entries:
+        row = rows.get(username)
+        if row is None:
+            row = rows[username] = {"b_username": username, "b_games": 0, "b_wins": 0, "b_total_game_time": 0, "b_updated_at": now}
+        row["b_games"] += 1
+        row["b_wins"] += int(won)
+        row["b_total_game_time"] += game_time
+    return list(rows.values())
+
+@timed(db_seconds)
+def rebuild_user_stats(session: Session | None = None):
+    with session_scope(session) as session:
+        statement = (
+            select(GameUsers.user_id, func.count(GameUsers.game_id), func.sum(case((GameUsers.winner == True, 1), else_=0)), func.sum(Games.game_time))
+            .select_from(GameUsers)
+            .join(Games, Games.id == GameUsers.game_id)
+            .group_by(GameUsers.user_id)
+        )
+        now = datetime.now()
+        rows = [
+            {"username": username, "games": games, "wins": wins or 0, "total_game_time": total_game_time or 0, "updated_at": now}
+            for username, games, wins, total_game_time in session.exec(statement)
+        ]
+        session.exec(delete(UserStats))
+        if rows:
+            session.exec(insert(UserStats), params=rows)
+        session.commit()
+    return len(rows)
+
+@timed(db_seconds)
+def select_user_info(username: str, session: Session | None = None):
+    with session_scope(session) as session:
         statement = select(Users).where(Users.username == username)
         result = session.exec(statement).first()
     return result
 
-def select_game_count_by_username(username: str):
-    with Session(engine) as session:
+@timed(db_seconds)
+def select_game_count_by_username(username: str, session: Session | None = None):
+    with session_scope(session) as session:
         statement = select(func.count(GameUsers.game_id)).where(GameUsers.user_id == username)
         results = session.exec(statement).first()
         return results
 
-def select_won_games_count_by_username(username: str):
-    with Session(engine) as session:
+@timed(db_seconds)
+def select_won_games_count_by_username(username: str, session: Session | None = None):
+    with session_scope(session) as session:
         statement = select(func.count(GameUsers.game_id)).where(GameUsers.user_id == username, GameUsers.winner == True)
         results = session.exec(statement).first()
         return results
 
-def select_mean_game_time_by_username(username: str):
-    with Session(engine) as session:
+@timed(db_seconds)
+def select_mean_game_time_by_username(username: str, session: Session | None = None):
+    with session_scope(session) as session:
         statement = select(func.avg(Games.game_time)).select_from(Games).join(GameUsers, Games.id == GameUsers.game_id).where(GameUsers.user_id == username)
         results = session.exec(statement).first()
         return results
 
-create_db_and_tables()
+@timed(db_seconds)
+def select_user_stats(username: str, session: Session | None = None):
+    with session_scope(session) as session:
+        return session.get(UserStats, username)
+
+LEADERBOARD_METRICS = ("wins", "win_rate", "mean_time")
+
+def leaderboard_statement(metric: str, after: tuple | None, limit: int, min_games: int):
+    # user_stats has one row per player, so this never touches the game history
+    if metric == "wins":
+        value, descending, filters = UserStats.wins, True, []
+    elif metric == "win_rate":
+        value, descending, filters = UserStats.wins * 1.0 / UserStats.games, True, [UserStats.games >= min_games]
+    else:
+        value, descending, filters = UserStats.total_game_time / UserStats.games, False, [UserStats.games >= min_games]
+    if after is not None:
+        after_value, after_username = after
+        beyond = value < after_value if descending else value > after_value
+        filters.append(or_(beyond, and_(value == after_value, UserStats.username > after_username)))
+    return (
+        select(UserStats, value)
+        .where(*filters)
+        .order_by(value.desc() if descending else value, UserStats.username)
+        .limit(limit)
+    )
+
+def leaderboard_rows(results) -> list[dict]:
+    return [
+        {
+            "username": stats.username,
+            "games": stats.games,
+            "wins": stats.wins,
+            "win_rate": stats.wins / stats.games if stats.games else 0,
+            "mean_game_time": stats.total_game_time / stats.games if stats.games else None,
+            "value": value,
+        }
+        for stats, value in results
+    ]
+
+def match_history_statement(username: str, before: int | None, limit: int):
+    # newest first, keyset on the game id so deep pages cost the same as the first one
+    statement = (
+        select(Games, GameUsers.winner)
+        .join(GameUsers, Games.id == GameUsers.game_id)
+        .where(GameUsers.user_id == username)
+    )
+    if before is not None:
+        statement = statement.where(GameUsers.game_id < before)
+    return statement.order_by(GameUsers.game_id.desc()).limit(limit)
+
+def match_history_rows(results) -> list[dict]:
+    return [
+        {"game_id": game.id, "game_time": game.game_time, "player_count": game.player_count, "won": won}
+        for game, won in results
+    ]
+
+@timed(db_seconds)
+def select_leaderboard(metric: str, after: tuple | None = None, limit: int = 20, min_games: int = 1, session: Session | None = None):
+    with session_scope(session) as session:
+        return leaderboard_rows(session.exec(leaderboard_statement(metric, after, limit, min_games)))
+
+@timed(db_seconds)
+def select_match_history(username: str, before: int | None = None, limit: int = 20, session: Session | None = None):
+    with session_scope(session) as session:
+        return match_history_rows(session.exec(match_history_statement(username, before, limit)))
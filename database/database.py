@@ -1,6 +1,12 @@
-from sqlmodel import SQLModel, create_engine
+from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from contextlib import contextmanager, asynccontextmanager
 import os
+import ssl
 from dotenv import load_dotenv
+from monitoring import metrics
 
 """db_password = os.environ.get('DB_PASSWORD')
 
@@ -10,26 +16,168 @@ if not db_password:
 print("Connecting to DB...")"""
 load_dotenv()
 
-#TEMPORARY
-test_db = True
-if not test_db:
-    database_url = os.environ.get("DATABASE_URL")
-    if not database_url:
-        raise ValueError("DATABASE_URL environment variable is not set!")
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    # with WAL, NORMAL only risks the last transactions on power loss, never corruption
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
 
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def create_sqlite_engine(sqlite_url: str):
     engine = create_engine(
+        sqlite_url,
+        echo=False,
+        connect_args={"check_same_thread": False, "timeout": 5},
+        pool_size=int(os.environ.get("DB_POOL_SIZE", 8)),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 8)),
+    )
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def create_async_sqlite_engine(sqlite_url: str) -> AsyncEngine:
+    engine = create_async_engine(
+        sqlite_url.replace("sqlite://", "sqlite+aiosqlite://", 1),
+        echo=False,
+        connect_args={"timeout": 5},
+        pool_size=int(os.environ.get("DB_POOL_SIZE", 8)),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 8)),
+    )
+    event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def create_server_engine(database_url: str):
+    return create_engine(
         database_url,
         echo=True,  # Set to False later
+        pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        pool_timeout=int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        # recycle before the server's idle timeout closes the connection under us
+        pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        pool_pre_ping=True,
         connect_args={
             "ssl": {
                 "ca": "./ssl/DigiCertGlobalRootG2.crt.pem"
             }
         }
     )
+
+
+def create_async_server_engine(database_url: str) -> AsyncEngine:
+    driver, _, rest = database_url.partition("://")
+    return create_async_engine(
+        f"{driver.split('+')[0]}+aiomysql://{rest}",
+        echo=True,  # Set to False later
+        pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        pool_timeout=int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        pool_pre_ping=True,
+        connect_args={"ssl": ssl.create_default_context(cafile="./ssl/DigiCertGlobalRootG2.crt.pem")}
+    )
+
+
+#TEMPORARY
+test_db = True
+if not test_db:
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable is not set!")
+
+    engine = create_server_engine(database_url)
+    async_engine = create_async_server_engine(database_url)
 else:
-    sqlite_file_name = "database/database.db"
+    sqlite_file_name = os.environ.get("SQLITE_FILE", "database/database.db")
     sqlite_url = f"sqlite:///{sqlite_file_name}"
-    engine = create_engine(sqlite_url, echo = False)
+    engine = create_sqlite_engine(sqlite_url)
+    async_engine = create_async_sqlite_engine(sqlite_url)
+
+# schema changes go through `python manage.py migrate`; the app only creates tables itself
+# for the local sqlite database, so a fresh checkout still starts with one command
+auto_migrate = os.environ.get("DB_AUTO_MIGRATE", "1" if test_db else "0") == "1"
+
+
+def track_pool(engine) -> dict:
+    counters = {"connects": 0, "checkouts": 0, "checkins": 0, "invalidated": 0}
+
+    def count(name):
+        def listener(*args):
+            counters[name] += 1
+        return listener
+
+    event.listen(engine, "connect", count("connects"))
+    event.listen(engine, "checkout", count("checkouts"))
+    event.listen(engine, "checkin", count("checkins"))
+    event.listen(engine, "invalidate", count("invalidated"))
+    return counters
+
+
+pool_counters = {"sync": track_pool(engine), "async": track_pool(async_engine.sync_engine)}
+
+
+def pool_metrics() -> dict:
+    metrics = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        metrics[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checked_in": pool.checkedin(),
+            **pool_counters[name],
+        }
+    return metrics
+
+
+metrics.registry.gauge(
+    "tte_db_pool_connections", "Pooled database connections",
+    lambda: {(name, state): pool[state] for name, pool in pool_metrics().items() for state in ("checked_out", "checked_in", "overflow")},
+    ("engine", "state"),
+)
+
+
+# one session per request, so every query a request makes reuses the same pooled connection.
+# Objects loaded here end up in the user cache, so a commit must not expire them.
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+@contextmanager
+def session_scope(session: Session | None = None):
+    if session is not None:
+        yield session
+    else:
+        with Session(engine) as new_session:
+            yield new_session
+
+
+@asynccontextmanager
+async def async_session_scope(session: AsyncSession | None = None):
+    if session is not None:
+        yield session
+    else:
+        async with AsyncSession(async_engine) as new_session:
+            yield new_session
+
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+def create_db_and_tables(bind=None):
+    import database.models  # noqa: F401 - registers the tables on SQLModel.metadata
+    bind = engine if bind is None else bind
+    SQLModel.metadata.create_all(bind)
+    # create_all only adds indexes along with a new table, existing tables get the missing ones here
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
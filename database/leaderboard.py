@@ -0,0 +1,88 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+from database import DB_async as dba
+from database.DB_main import LEADERBOARD_METRICS
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(row: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps([row["value"], row["username"]]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    decoded = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    # the route turns ValueError into a 400, anything else a client sends has to end up as one
+    if not isinstance(decoded, list) or len(decoded) != 2:
+        raise ValueError("malformed cursor")
+    value, username = decoded
+    if not isinstance(username, str) or not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise ValueError("malformed cursor")
+    return value, username
+
+
+class Leaderboard:
+    def __init__(self, size: int = 100, refresh_interval: float = 30, min_games: int = 5):
+        self.size = size
+        self.refresh_interval = refresh_interval
+        # win rate and mean time only rank players with enough games to mean something
+        self.min_games = min_games
+        self.boards: dict[str, list[dict]] = {metric: [] for metric in LEADERBOARD_METRICS}
+        self.positions: dict[str, dict[str, int]] = {metric: {} for metric in LEADERBOARD_METRICS}
+        self.loaded = False
+        self.task: asyncio.Task | None = None
+
+    def _min_games(self, metric: str) -> int:
+        return 1 if metric == "wins" else self.min_games
+
+    async def refresh(self):
+        for metric in LEADERBOARD_METRICS:
+            rows = await dba.select_leaderboard(metric, limit=self.size, min_games=self._min_games(metric))
+            self.boards[metric] = rows
+            self.positions[metric] = {row["username"]: index for index, row in enumerate(rows)}
+        self.loaded = True
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("could not refresh the leaderboard")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def page(self, metric: str, cursor: str | None = None, limit: int = 20) -> dict:
+        after = decode_cursor(cursor) if cursor else None
+        board = self.boards[metric]
+        start = 0
+        if after is not None:
+            index = self.positions[metric].get(after[1])
+            start = index + 1 if index is not None and board[index]["value"] == after[0] else None
+        # the cached top-N answers every page inside it, only pages past it reach the database
+        if self.loaded and start is not None and (start + limit <= len(board) or len(board) < self.size):
+            rows = board[start:start + limit]
+        else:
+            rows = await dba.select_leaderboard(metric, after, limit, self._min_games(metric))
+        return {
+            "metric": metric,
+            "rows": [{key: value for key, value in row.items() if key != "value"} for row in rows],
+            "next": encode_cursor(rows[-1]) if len(rows) == limit else None,
+        }
+
+
+leaderboard = Leaderboard(
+    size=int(os.environ.get("LEADERBOARD_SIZE", 100)),
+    refresh_interval=float(os.environ.get("LEADERBOARD_REFRESH_SECONDS", 30)),
+    min_games=int(os.environ.get("LEADERBOARD_MIN_GAMES", 5)),
+)
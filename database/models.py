@@ -1,5 +1,7 @@
 from pydantic import EmailStr
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
+from datetime import datetime
 
 class Games(SQLModel, table=True):
     id: int = Field(primary_key=True)
@@ -12,6 +14,18 @@ class Users(SQLModel, table=True):
     email: EmailStr | None = Field(default= None, unique=True)
 
 class GameUsers(SQLModel, table=True):
+    # the primary key is led by game_id, these serve per-user history and win counts
+    __table_args__ = (
+        Index("ix_gameusers_user_id_game_id", "user_id", "game_id"),
+        Index("ix_gameusers_user_id_winner", "user_id", "winner"),
+    )
     game_id: int = Field(foreign_key="games.id", primary_key=True)
     user_id: str = Field(foreign_key="users.username", primary_key=True)
     winner: bool = Field(default=False)
+
+class UserStats(SQLModel, table=True):
+    username: str = Field(foreign_key="users.username", primary_key=True)
+    games: int = Field(default=0)
+    wins: int = Field(default=0, index=True)
+    total_game_time: float = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.now)
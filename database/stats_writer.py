@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+from database import DB_async as dba
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class StatsWriter:
+    def __init__(self, batch_size: int = 200, flush_interval: float = 0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # a single writer task keeps the writes ordered and never competes with itself for the db lock
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: asyncio.Task | None = None
+        self.written = 0
+        self.failed = 0
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def submit(self, game_id: int, game_time: float, players: list[str], winner: str):
+        self.start()
+        self.queue.put_nowait(
+            {"game_id": game_id, "game_time": game_time, "players": list(players), "winner": winner, "queued_at": time.monotonic()}
+        )
+
+    async def stop(self):
+        if self.task is None or self.task.done():
+            return
+        self.queue.put_nowait(_STOP)
+        await self.task
+        self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+            if stopping:
+                return
+
+    async def _write(self, batch: list[dict]):
+        try:
+            await dba.add_game_results(batch)
+        except Exception:
+            if len(batch) == 1:
+                self.failed += 1
+                logger.exception("could not write the result of game %s", batch[0]["game_id"])
+                return
+            # one bad row rolls the whole batch back, halving it keeps the rest and narrows down the bad one
+            middle = len(batch) // 2
+            await self._write(batch[:middle])
+            await self._write(batch[middle:])
+            return
+        self.written += len(batch)
+
+    def oldest_pending_seconds(self) -> float:
+        # how far the writer is behind, the queue depth alone does not tell a burst from a stuck disk
+        if self.queue._queue:
+            first = self.queue._queue[0]
+            if first is not _STOP:
+                return time.monotonic() - first["queued_at"]
+        return 0.0
+
+
+stats_writer = StatsWriter()
+
+metrics.registry.gauge("tte_stats_queue_depth", "Game results waiting to be written", lambda: stats_writer.queue.qsize())
+metrics.registry.gauge("tte_stats_oldest_pending_seconds", "Age of the oldest game result waiting to be written", stats_writer.oldest_pending_seconds)
+metrics.registry.collected_counter("tte_stats_written_total", "Game results written", lambda: stats_writer.written)
+metrics.registry.collected_counter("tte_stats_failed_total", "Game results that could not be written", lambda: stats_writer.failed)
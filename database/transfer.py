@@ -0,0 +1,182 @@
+import csv
+import os
+from sqlmodel import Session, select, insert
+from database.models import Games, GameUsers, Users
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+FORMATS = ("csv", "parquet")
+
+# Exports are a directory of part files, one per chunk. A part is written under a temporary name
+# and renamed once complete, so an interrupted export resumes after the last finished part. An
+# import commits one part per transaction and skips parts whose first row is already there, so it
+# can simply be run again.
+
+
+class GameHistory:
+    name = "games"
+    columns = ("game_id", "game_time", "player_count", "user_id", "winner")
+    # game_time is declared an int on the model but the app stores the float seconds a game took
+    types = (int, float, int, str, bool)
+
+    @staticmethod
+    def key(row: dict):
+        return row["game_id"]
+
+    @staticmethod
+    def fetch(session: Session, after, chunk_size: int) -> list[dict]:
+        # chunks hold whole games, a game split over two parts would break the resume check
+        statement = select(Games.id, Games.game_time, Games.player_count).order_by(Games.id).limit(chunk_size)
+        if after is not None:
+            statement = statement.where(Games.id > after)
+        games = session.exec(statement).all()
+        if not games:
+            return []
+        players_statement = (
+            select(GameUsers.game_id, GameUsers.user_id, GameUsers.winner)
+            .where(GameUsers.game_id >= games[0][0], GameUsers.game_id <= games[-1][0])
+            .order_by(GameUsers.game_id, GameUsers.user_id)
+        )
+        players: dict[int, list] = {}
+        for game_id, user_id, winner in session.exec(players_statement):
+            players.setdefault(game_id, []).append((user_id, winner))
+        rows = []
+        for game_id, game_time, player_count in games:
+            for user_id, winner in players.get(game_id, [(None, None)]):
+                rows.append({"game_id": game_id, "game_time": game_time, "player_count": player_count, "user_id": user_id, "winner": winner})
+        return rows
+
+    @staticmethod
+    def exists(session: Session, row: dict) -> bool:
+        return session.get(Games, row["game_id"]) is not None
+
+    @staticmethod
+    def insert(session: Session, rows: list[dict]):
+        games = {}
+        game_users = []
+        for row in rows:
+            games.setdefault(row["game_id"], {"id": row["game_id"], "game_time": row["game_time"], "player_count": row["player_count"]})
+            if row["user_id"] is not None:
+                game_users.append({"game_id": row["game_id"], "user_id": row["user_id"], "winner": bool(row["winner"])})
+        session.exec(insert(Games), params=list(games.values()))
+        if game_users:
+            session.exec(insert(GameUsers), params=game_users)
+
+
+class UserAccounts:
+    name = "users"
+    columns = ("username", "password", "email")
+    types = (str, str, str)
+
+    @staticmethod
+    def key(row: dict):
+        return row["username"]
+
+    @staticmethod
+    def fetch(session: Session, after, chunk_size: int) -> list[dict]:
+        statement = select(Users.username, Users.password, Users.email).order_by(Users.username).limit(chunk_size)
+        if after is not None:
+            statement = statement.where(Users.username > after)
+        return [{"username": username, "password": password, "email": email} for username, password, email in session.exec(statement)]
+
+    @staticmethod
+    def exists(session: Session, row: dict) -> bool:
+        return session.get(Users, row["username"]) is not None
+
+    @staticmethod
+    def insert(session: Session, rows: list[dict]):
+        session.exec(insert(Users), params=rows)
+
+
+TABLES = {table.name: table for table in (GameHistory, UserAccounts)}
+
+
+def _require_format(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format: {fmt}")
+    if fmt == "parquet" and pyarrow is None:
+        raise RuntimeError("parquet needs pyarrow, install it with `pip install pyarrow`")
+
+
+def part_paths(directory: str, table, fmt: str) -> list[str]:
+    prefix, suffix = f"{table.name}-", f".{fmt}"
+    names = sorted(name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith(suffix))
+    return [os.path.join(directory, name) for name in names]
+
+
+def write_part(path: str, table, fmt: str, rows: list[dict]):
+    temporary = path + ".tmp"
+    if fmt == "csv":
+        with open(temporary, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(table.columns)
+            for row in rows:
+                writer.writerow(["" if row[column] is None else int(row[column]) if kind is bool else row[column]
+                                 for column, kind in zip(table.columns, table.types)])
+    else:
+        arrow_types = {int: pyarrow.int64(), float: pyarrow.float64(), str: pyarrow.string(), bool: pyarrow.bool_()}
+        schema = pyarrow.schema([(column, arrow_types[kind]) for column, kind in zip(table.columns, table.types)])
+        columns = {column: [row[column] for row in rows] for column in table.columns}
+        pyarrow.parquet.write_table(pyarrow.table(columns, schema=schema), temporary, compression="zstd")
+    os.replace(temporary, path)
+
+
+def read_part(path: str, table, fmt: str) -> list[dict]:
+    if fmt == "parquet":
+        return pyarrow.parquet.read_table(path).to_pylist()
+    rows = []
+    with open(path, newline="", encoding="utf-8") as file:
+        for record in csv.DictReader(file):
+            rows.append({
+                column: None if record[column] == "" else bool(int(record[column])) if kind is bool else kind(record[column])
+                for column, kind in zip(table.columns, table.types)
+            })
+    return rows
+
+
+def export_table(engine, directory: str, table_name: str = "games", fmt: str = "csv", chunk_size: int = 50000, log=None) -> int:
+    _require_format(fmt)
+    table = TABLES[table_name]
+    os.makedirs(directory, exist_ok=True)
+    existing = part_paths(directory, table, fmt)
+    after = table.key(read_part(existing[-1], table, fmt)[-1]) if existing else None
+    index = len(existing)
+    exported = 0
+    with Session(engine) as session:
+        while True:
+            rows = table.fetch(session, after, chunk_size)
+            if not rows:
+                break
+            path = os.path.join(directory, f"{table.name}-{index:06d}.{fmt}")
+            write_part(path, table, fmt, rows)
+            after = table.key(rows[-1])
+            index += 1
+            exported += len(rows)
+            if log is not None:
+                log(f"wrote {len(rows)} rows to {path}")
+    return exported
+
+
+def import_table(engine, directory: str, table_name: str = "games", fmt: str = "csv", log=None) -> int:
+    _require_format(fmt)
+    table = TABLES[table_name]
+    imported = 0
+    for path in part_paths(directory, table, fmt):
+        rows = read_part(path, table, fmt)
+        if not rows:
+            continue
+        with Session(engine) as session:
+            if table.exists(session, rows[0]):
+                if log is not None:
+                    log(f"skipped {path}, already imported")
+                continue
+            table.insert(session, rows)
+            session.commit()
+        imported += len(rows)
+        if log is not None:
+            log(f"imported {len(rows)} rows from {path}")
+    return imported
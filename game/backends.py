@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+from game.lobby import LobbyIndex
+from game.protocol import pack
+
+logger = logging.getLogger(__name__)
+
+# seconds between attempts to get back to a broker that went away, doubled up to the maximum
+BROKER_RECONNECT_DELAY = 0.5
+BROKER_RECONNECT_MAX_DELAY = 10.0
+
+
+# single-process room directory, every room is owned by this worker
+class RoomBackend:
+    def __init__(self, worker_id: str = "local"):
+        self.worker_id = worker_id
+        self.rooms: dict[str, dict] = {}
+        self.lobby = LobbyIndex()
+        self.manager = None
+
+    async def start(self, manager):
+        self.manager = manager
+
+    async def stop(self):
+        pass
+
+    def set_room(self, room_id: str, players: list[str], max_players: int, track_length: int):
+        self._store_room({
+            "room_id": room_id,
+            "players": players,
+            "max_players": max_players,
+            "track_length": track_length,
+            "worker": self.worker_id,
+        })
+
+    def remove_room(self, room_id: str):
+        self._drop_room(room_id)
+
+    def _store_room(self, room: dict):
+        self.rooms[room["room_id"]] = room
+        self.lobby.update(room["room_id"], len(room["players"]), room["max_players"])
+
+    def _drop_room(self, room_id: str):
+        self.rooms.pop(room_id, None)
+        self.lobby.remove(room_id)
+
+    def get_room(self, room_id: str) -> dict | None:
+        return self.rooms.get(room_id)
+
+    def list_rooms(self) -> list[dict]:
+        return list(self.rooms.values())
+
+    def is_local(self, room_id: str) -> bool:
+        room = self.rooms.get(room_id)
+        return room is None or room["worker"] == self.worker_id
+
+    def can_create_rooms(self) -> bool:
+        return True
+
+    def send_to_worker(self, worker_id: str, message: dict):
+        raise RuntimeError(f"worker {worker_id} is not reachable from an in-memory backend")
+
+    def send_to_owner(self, room_id: str, message: dict):
+        self.send_to_worker(self.rooms[room_id]["worker"], message)
+
+
+# room directory shared between workers through game/broker.py. Each room is owned by the
+# worker that created it, the others mirror the directory and relay their players' sockets
+# to the owner over the broker.
+class PubSubBackend(RoomBackend):
+    def __init__(self, socket_path: str):
+        super().__init__(worker_id=f"{socket.gethostname()}:{os.getpid()}")
+        self.socket_path = socket_path
+        self.writer: asyncio.StreamWriter | None = None
+        self.listener: asyncio.Task | None = None
+
+    async def start(self, manager):
+        await super().start(manager)
+        reader = await self._connect()
+        self.listener = asyncio.create_task(self._run(reader))
+
+    async def _connect(self) -> asyncio.StreamReader:
+        reader, self.writer = await asyncio.open_unix_connection(self.socket_path)
+        self._send({"op": "hello", "worker": self.worker_id})
+        # the broker forgets a worker's rooms when it goes away, a reconnect announces them again
+        for room in self.rooms.values():
+            if room["worker"] == self.worker_id:
+                self._send({"op": "room", "room": room})
+        return reader
+
+    async def _run(self, reader: asyncio.StreamReader):
+        while True:
+            await self._listen(reader)
+            self.writer.close()
+            self.writer = None
+            delay = BROKER_RECONNECT_DELAY
+            while self.writer is None:
+                await asyncio.sleep(delay)
+                try:
+                    reader = await self._connect()
+                except OSError as error:
+                    logger.warning("could not reconnect to the room broker: %s", error)
+                    delay = min(delay * 2, BROKER_RECONNECT_MAX_DELAY)
+            logger.info("reconnected to the room broker")
+
+    async def stop(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            self.listener = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def _send(self, message: dict):
+        if self.writer is not None:
+            self.writer.write(json.dumps(message).encode() + b"\n")
+
+    def can_create_rooms(self) -> bool:
+        # without the broker nobody could tell whether another worker already owns the name
+        return self.writer is not None
+
+    def set_room(self, room_id: str, players: list[str], max_players: int, track_length: int):
+        super().set_room(room_id, players, max_players, track_length)
+        self._send({"op": "room", "room": self.rooms[room_id]})
+
+    def remove_room(self, room_id: str):
+        super().remove_room(room_id)
+        self._send({"op": "room_removed", "room_id": room_id})
+
+    def send_to_worker(self, worker_id: str, message: dict):
+        self._send({"op": "send", "worker": worker_id, "data": message})
+
+    async def _listen(self, reader: asyncio.StreamReader):
+        while True:
+            try:
+                line = await reader.readline()
+            except OSError:
+                line = b""
+            if not line:
+                logger.error("lost connection to the room broker")
+                return
+            message = json.loads(line)
+            op = message["op"]
+            if op == "rooms":
+                # the whole directory, after a reconnect it also drops rooms removed in the meantime
+                current = {room["room_id"] for room in message["rooms"]}
+                for room_id, room in list(self.rooms.items()):
+                    if room["worker"] != self.worker_id and room_id not in current:
+                        self._drop_room(room_id)
+                for room in message["rooms"]:
+                    if room["worker"] != self.worker_id:
+                        self._store_room(room)
+            elif op == "room":
+                room = message["room"]
+                if room["worker"] != self.worker_id:
+                    self._store_room(room)
+            elif op == "room_removed":
+                room = self.rooms.get(message["room_id"])
+                if room is not None and room["worker"] != self.worker_id:
+                    self._drop_room(message["room_id"])
+            elif op == "message":
+                try:
+                    await self.manager.handle_backend_message(message["data"])
+                except Exception:
+                    logger.exception("could not handle relayed message %r", message["data"])
+
+
+# stands in for the socket of a player connected to another worker
+class RemoteConnection:
+    def __init__(self, backend: RoomBackend, worker_id: str, room_id: str, username: str):
+        self.backend = backend
+        self.worker_id = worker_id
+        self.room_id = room_id
+        self.username = username
+
+    def push(self, message: str, seq: int | None = None) -> bool:
+        self.backend.send_to_worker(
+            self.worker_id,
+            {"type": "deliver", "room_id": self.room_id, "username": self.username, "message": pack(message), "seq": seq},
+        )
+        return True
+
+    def close(self, code: int | None = None):
+        if code is not None:
+            self.backend.send_to_worker(
+                self.worker_id,
+                {"type": "close", "room_id": self.room_id, "username": self.username, "code": code},
+            )
+
+
+def create_backend() -> RoomBackend:
+    backend = os.environ.get("ROOM_BACKEND", "memory")
+    if backend == "memory":
+        return RoomBackend()
+    if backend == "pubsub":
+        return PubSubBackend(os.environ.get("ROOM_BROKER_SOCKET", "/tmp/projekttte-rooms.sock"))
+    raise ValueError(f"unknown room backend: {backend}")
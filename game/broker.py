@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class RoomBroker:
+    def __init__(self):
+        self.workers: dict[str, asyncio.StreamWriter] = {}
+        self.rooms: dict[str, dict] = {}
+
+    def _send(self, writer: asyncio.StreamWriter, message: dict):
+        writer.write(json.dumps(message).encode() + b"\n")
+
+    def _broadcast(self, message: dict, skip: str | None = None):
+        for worker_id, writer in self.workers.items():
+            if worker_id != skip:
+                self._send(writer, message)
+
+    async def handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker_id = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                op = message["op"]
+                if op == "hello":
+                    worker_id = message["worker"]
+                    self.workers[worker_id] = writer
+                    self._send(writer, {"op": "rooms", "rooms": list(self.rooms.values())})
+                    logger.info("worker %s connected", worker_id)
+                elif op == "room":
+                    self.rooms[message["room"]["room_id"]] = message["room"]
+                    self._broadcast(message, skip=worker_id)
+                elif op == "room_removed":
+                    room = self.rooms.get(message["room_id"])
+                    if room is not None and room["worker"] == worker_id:
+                        del self.rooms[message["room_id"]]
+                        self._broadcast(message, skip=worker_id)
+                elif op == "send":
+                    target = self.workers.get(message["worker"])
+                    if target is not None:
+                        self._send(target, {"op": "message", "data": message["data"]})
+                await writer.drain()
+        finally:
+            if worker_id is not None:
+                self.workers.pop(worker_id, None)
+                for room_id in [room_id for room_id, room in self.rooms.items() if room["worker"] == worker_id]:
+                    del self.rooms[room_id]
+                    self._broadcast({"op": "room_removed", "room_id": room_id})
+                logger.info("worker %s disconnected", worker_id)
+            writer.close()
+
+
+async def serve(socket_path: str):
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    broker = RoomBroker()
+    server = await asyncio.start_unix_server(broker.handle_worker, path=socket_path)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="relays room state and messages between game workers")
+    parser.add_argument("--socket", default=os.environ.get("ROOM_BROKER_SOCKET", "/tmp/projekttte-rooms.sock"))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.socket))
+
+
+if __name__ == "__main__":
+    main()
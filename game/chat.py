@@ -0,0 +1,34 @@
+import json
+import time
+
+CHAT_LINES_PREFIX = "CHAT_LINES:"
+
+
+def chat_lines_message(lines) -> str:
+    # several chat lines in one message, used for history replay and coalesced bursts
+    return CHAT_LINES_PREFIX + json.dumps(list(lines), separators=(",", ":"))
+
+
+def is_chat(message: str) -> bool:
+    return message.startswith(" ") or message.startswith(CHAT_LINES_PREFIX)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated", "limited")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # set once a message was refused, so the sender is told once per flood, not per message
+        self.limited = False
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
@@ -0,0 +1,85 @@
+import random
+from game.room_state import RoomState
+
+# The race rules, free of sockets and clocks. A command (toggle_ready, roll, skip) looks at the
+# room and returns the events it causes without changing anything; apply() is the only place
+# the game state of a room changes. Events are (kind, username, value) tuples, so replaying the
+# events of a game over a room with the same seats rebuilds the same state, and the dice come
+# from the room's own seeded generator, so a room seed replays the same rolls. STARTED and TURN
+# carry the seat of the player whose turn it is, so applying them never searches the seats.
+READY = "ready"
+STARTED = "started"
+ROLLED = "rolled"
+MOVED = "moved"
+TURN = "turn"
+WON = "won"
+
+DICE_SIDES = 6
+
+
+def rng(room: RoomState) -> random.Random:
+    # made on the first roll, rooms that never start a game do not carry a generator
+    if room.rng is None:
+        room.rng = random.Random(room.seed)
+    return room.rng
+
+
+def next_seat(room: RoomState) -> int:
+    return (room.turn_index + 1) % len(room.seats)
+
+
+def toggle_ready(room: RoomState, username: str) -> list[tuple]:
+    player = room.players.get(username)
+    if player is None:
+        return []
+    events = [(READY, username, not player.ready)]
+    if not player.ready and all(other.ready for other in room.seats if other is not player):
+        events.append((STARTED, room.seats[0].username, 0))
+    return events
+
+
+def roll(room: RoomState, username: str) -> list[tuple]:
+    player = room.current_player()
+    if player is None or player.username != username:
+        return []
+    dice = rng(room).randint(1, DICE_SIDES)
+    position = player.position + dice
+    events = [(ROLLED, username, dice)]
+    if position < room.track_length - 1:
+        seat = next_seat(room)
+        events.append((MOVED, username, position))
+        events.append((TURN, room.seats[seat].username, seat))
+    else:
+        events.append((WON, username, room.track_length - 1))
+    return events
+
+
+def skip(room: RoomState, username: str) -> list[tuple]:
+    player = room.current_player()
+    if player is None or player.username != username:
+        return []
+    seat = next_seat(room)
+    return [(TURN, room.seats[seat].username, seat)]
+
+
+def apply(room: RoomState, event: tuple):
+    kind, username, value = event
+    if kind == READY:
+        room.players[username].ready = value
+    elif kind == STARTED:
+        for player in room.seats:
+            player.position = 0
+        room.turn_index = value
+    elif kind == MOVED:
+        room.players[username].position = value
+    elif kind == TURN:
+        room.turn_index = value
+    elif kind == WON:
+        room.players[username].position = value
+        # the game is over, nobody holds the turn until everyone is ready again
+        room.turn_index = -1
+
+
+def replay(room: RoomState, events: list[tuple]):
+    for event in events:
+        apply(room, event)
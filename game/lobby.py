@@ -0,0 +1,76 @@
+import bisect
+import os
+from collections import OrderedDict
+
+SORT_NAME = "name"
+SORT_FILL = "fill"
+
+# query results kept between directory changes, a client sending endless prefixes only churns these
+RESULT_CACHE_SIZE = 32
+
+
+class LobbyIndex:
+    def __init__(self):
+        self.entries: dict[str, dict] = {}
+        # room ids kept sorted so a name prefix is a bisect range, not a scan
+        self.names: list[str] = []
+        self.version = 0
+        # distinguishes this process so an ETag from another worker or a restart never matches
+        self.epoch = os.urandom(4).hex()
+        self._results: OrderedDict[tuple, list[dict]] = OrderedDict()
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.epoch}-{self.version}"'
+
+    def update(self, room_id: str, player_count: int, max_players: int):
+        entry = self.entries.get(room_id)
+        if player_count == 0:
+            self.remove(room_id)
+            return
+        if entry is not None and entry["player_count"] == player_count and entry["max_players"] == max_players:
+            return
+        if entry is None:
+            bisect.insort(self.names, room_id)
+        self.entries[room_id] = {"room_id": room_id, "player_count": player_count, "max_players": max_players}
+        self._changed()
+
+    def remove(self, room_id: str):
+        if self.entries.pop(room_id, None) is None:
+            return
+        del self.names[bisect.bisect_left(self.names, room_id)]
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._results.clear()
+
+    def query(self, prefix: str = "", open_only: bool = False, sort: str = SORT_NAME, page: int = 1, page_size: int = 20) -> dict:
+        key = (prefix, open_only, sort)
+        results = self._results.get(key)
+        if results is None:
+            results = self._select(prefix, open_only, sort)
+            self._results[key] = results
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        else:
+            self._results.move_to_end(key)
+        start = (page - 1) * page_size
+        return {
+            "rooms": results[start:start + page_size],
+            "total": len(results),
+            "page": page,
+            "page_size": page_size,
+        }
+
+    def _select(self, prefix: str, open_only: bool, sort: str) -> list[dict]:
+        if prefix:
+            names = self.names[bisect.bisect_left(self.names, prefix):bisect.bisect_left(self.names, prefix + "\U0010ffff")]
+        else:
+            names = self.names
+        rooms = [self.entries[room_id] for room_id in names]
+        if open_only:
+            rooms = [room for room in rooms if room["player_count"] < room["max_players"]]
+        if sort == SORT_FILL:
+            rooms.sort(key=lambda room: room["player_count"] / max(room["max_players"], 1), reverse=True)
+        return rooms
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from collections import deque
+from fastapi import WebSocket
+from game.protocol import FrameEncoder
+from game.chat import is_chat
+from monitoring import metrics
+
+DROP_OLDEST = "drop_oldest"
+MERGE_SNAPSHOTS = "merge_snapshots"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, MERGE_SNAPSHOTS, DISCONNECT)
+
+# messages that carry the full room state, so a newer one makes any queued older one useless
+SNAPSHOT_PREFIXES = ("PLAYERLIST:", "READY_STATUS:", "PLAYER_POSITIONS:")
+
+SLOW_CONSUMER_CLOSE_CODE = 1008
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_prefix(message: str):
+    for prefix in SNAPSHOT_PREFIXES:
+        if message.startswith(prefix):
+            return prefix
+    return None
+
+
+class OutboundQueue:
+    def __init__(self, websocket: WebSocket, max_size: int = 64, overflow_policy: str = DROP_OLDEST, encoder: FrameEncoder | None = None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy: {overflow_policy}")
+        self.websocket = websocket
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.encoder = encoder
+        # (message, room seq) pairs, the seq is None for messages that are not room broadcasts
+        self.messages: deque[tuple[str, int | None]] = deque()
+        # room seq of the newest broadcast the writer actually got out, what a resume replays after
+        self.sent_seq: int | None = None
+        self.dropped = 0
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def push(self, message: str, seq: int | None = None) -> bool:
+        if self.closed:
+            return False
+        if len(self.messages) >= self.max_size and not self._make_room(message):
+            return False
+        self.messages.append((message, seq))
+        self._wakeup.set()
+        return True
+
+    def _make_room(self, message: str) -> bool:
+        if self.overflow_policy == DISCONNECT:
+            self.close(SLOW_CONSUMER_CLOSE_CODE)
+            return False
+        if self.overflow_policy == MERGE_SNAPSHOTS:
+            prefix = snapshot_prefix(message)
+            if prefix is not None:
+                for index, (queued, _) in enumerate(self.messages):
+                    if queued.startswith(prefix):
+                        del self.messages[index]
+                        self.dropped += 1
+                        return True
+        # chat goes first so a flood never pushes game events out of the queue
+        for index, (queued, _) in enumerate(self.messages):
+            if is_chat(queued):
+                del self.messages[index]
+                self.dropped += 1
+                return True
+        self.messages.popleft()
+        self.dropped += 1
+        return True
+
+    async def _write_loop(self):
+        while True:
+            if not self.messages:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self.encoder is None:
+                frame, seq = self.messages.popleft()
+            else:
+                # everything broadcast since the last write leaves as one frame
+                messages = [message for message, _ in self.messages]
+                seq = max((seq for _, seq in self.messages if seq is not None), default=None)
+                self.messages.clear()
+                try:
+                    frame = self.encoder.encode(messages)
+                except Exception:
+                    # a message the encoder cannot read costs this frame, not the connection
+                    logger.exception("could not encode %d messages", len(messages))
+                    continue
+                if frame is None:
+                    continue
+            started = metrics.ws_send_seconds.start()
+            try:
+                await self.websocket.send_text(frame)
+            except Exception:
+                # the socket is gone, the receive loop in the endpoint handles the cleanup
+                self.closed = True
+                self.messages.clear()
+                return
+            metrics.ws_send_seconds.stop(started)
+            if seq is not None:
+                self.sent_seq = seq
+            if metrics.registry.enabled:
+                metrics.ws_messages_out.inc()
+                metrics.ws_bytes_out.inc(len(frame.encode()))
+
+    def close(self, code: int | None = None):
+        if self.closed:
+            return
+        self.closed = True
+        self.messages.clear()
+        self._writer.cancel()
+        if code is not None:
+            asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
@@ -0,0 +1,105 @@
+import json
+import logging
+from game.chat import CHAT_LINES_PREFIX
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_V2 = "tte.v2"
+
+EVENT_CODES = {"GAME_START": "start", "TURN_CHANGE": "turn", "WIN": "win", "DICE_ROLL": "dice", "SESSION": "session"}
+
+
+# A snapshot message that also carries the state it was made from. The v2 encoder uses the state
+# instead of parsing the text back, usernames can contain the separators of the text format.
+class Snapshot(str):
+    def __new__(cls, text: str, kind: str, state):
+        message = super().__new__(cls, text)
+        message.kind = kind
+        message.state = state
+        return message
+
+
+# messages relayed between workers go through JSON, these keep a snapshot's state on the way
+def pack(message: str):
+    if isinstance(message, Snapshot):
+        return [str(message), message.kind, message.state]
+    return message
+
+
+def unpack(packed) -> str:
+    if isinstance(packed, list):
+        return Snapshot(*packed)
+    return packed
+
+
+def negotiate(offered: list[str]) -> str | None:
+    return PROTOCOL_V2 if PROTOCOL_V2 in offered else None
+
+
+def _parse_pairs(payload: str) -> dict[str, str]:
+    pairs = {}
+    for pair in payload.split(","):
+        if pair:
+            username, _, value = pair.rpartition(":")
+            pairs[username] = value
+    return pairs
+
+
+# Turns the text messages the ConnectionManager produces into v2 frames for one connection.
+# Every message queued since the last write goes into a single frame, and ready/position
+# snapshots are reduced to the entries that changed since the last frame this client got.
+class FrameEncoder:
+    def __init__(self):
+        self.sent: dict[str, dict | None] = {"ready": None, "pos": None}
+
+    def encode(self, messages: list[str]) -> str | None:
+        events = []
+        for message in messages:
+            try:
+                event = self._event(message)
+            except ValueError:
+                # a text snapshot that does not parse is left out, the rest of the frame still goes
+                logger.warning("could not encode %r", message)
+                continue
+            if event is not None:
+                self._append(events, event)
+        if not events:
+            return None
+        return json.dumps(events, separators=(",", ":"))
+
+    def _event(self, message: str):
+        if isinstance(message, Snapshot):
+            if message.kind == "players":
+                return ["players", list(message.state)]
+            # the state is shared by every connection of the room, the encoder keeps its own copy
+            return self._snapshot(message.kind, dict(message.state))
+        kind, _, payload = message.partition(":")
+        if kind == "PLAYERLIST":
+            return ["players", [username for username in payload.split(",") if username]]
+        if kind == "READY_STATUS":
+            return self._snapshot("ready", {username: status == "ready" for username, status in _parse_pairs(payload).items()})
+        if kind == "PLAYER_POSITIONS":
+            return self._snapshot("pos", {username: int(position) for username, position in _parse_pairs(payload).items()})
+        if message.startswith(CHAT_LINES_PREFIX):
+            return ["chat_lines", json.loads(payload)]
+        if kind in EVENT_CODES:
+            return [EVENT_CODES[kind], payload]
+        return ["chat", message]
+
+    def _snapshot(self, kind: str, state: dict):
+        previous = self.sent[kind]
+        self.sent[kind] = state
+        if previous is None or previous.keys() != state.keys():
+            return [f"{kind}_all", state]
+        changed = {username: value for username, value in state.items() if previous[username] != value}
+        if not changed:
+            return None
+        return [kind, changed]
+
+    def _append(self, events: list, event: list):
+        if events and event[0] in ("ready", "pos") and events[-1][0] in (event[0], f"{event[0]}_all"):
+            events[-1][1].update(event[1])
+        elif events and event[0] in ("ready_all", "pos_all") and events[-1][0] in (event[0], event[0][:-4]):
+            events[-1] = event
+        else:
+            events.append(event)
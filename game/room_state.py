@@ -0,0 +1,138 @@
+import time
+from collections import deque
+
+
+# sits in a seat whose player dropped off and may still resume, pushes go nowhere
+class DetachedConnection:
+    __slots__ = ()
+
+    def push(self, message: str, seq: int | None = None) -> bool:
+        return False
+
+    def close(self, code: int | None = None):
+        pass
+
+
+DETACHED = DetachedConnection()
+
+
+class PlayerState:
+    __slots__ = ("username", "connection", "ready", "position", "chat_bucket", "resume_token", "seen_seq")
+
+    def __init__(self, username: str, connection):
+        self.username = username
+        self.connection = connection
+        self.ready = False
+        self.position = 0
+        self.chat_bucket = None
+        self.resume_token = None
+        # newest room seq the player's socket is known to have sent, a resume replays the events after it
+        self.seen_seq = 0
+
+    def is_detached(self) -> bool:
+        return self.connection is DETACHED
+
+    def saw(self, seq: int | None):
+        # None when the socket never got a broadcast out, the player still has what it had before
+        if seq is not None and seq > self.seen_seq:
+            self.seen_seq = seq
+
+
+class RoomState:
+    __slots__ = ("room_id", "max_players", "track_length", "start_time", "players", "seats", "turn_index", "last_activity",
+                 "chat_history_size", "chat_history", "chat_pending", "seq", "event_log_size", "event_log", "log_horizon", "seed", "rng")
+
+    def __init__(self, room_id: str, max_players: int = 4, track_length: int = 15, chat_history_size: int = 50,
+                 event_log_size: int = 64, seed: int | str | None = None):
+        self.room_id = room_id
+        self.max_players = max_players
+        self.track_length = track_length
+        self.start_time = 0
+        self.players: dict[str, PlayerState] = {}
+        # seat order is join order, turn_index points into it while a game is running
+        self.seats: list[PlayerState] = []
+        self.turn_index = -1
+        self.last_activity = time.monotonic()
+        # made on the first chat line, an empty deque would cost every idle room more than the rest of it
+        self.chat_history_size = chat_history_size
+        self.chat_history: deque[str] | None = None
+        # chat lines waiting for the coalescing window to close, None while no window is open
+        self.chat_pending: list[str] | None = None
+        # every broadcast gets a sequence number, the events among them are kept for resuming players;
+        # snapshots are left out, a resume sends a fresh one anyway
+        self.seq = 0
+        # made on the first event, like chat_history
+        self.event_log_size = event_log_size
+        self.event_log: deque[tuple[int, str]] | None = None
+        # newest sequence number that fell out of the log
+        self.log_horizon = 0
+        # the dice of this room, game/engine.py makes the generator from the seed when it is first needed
+        self.seed = seed
+        self.rng = None
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def add_chat(self, line: str):
+        if self.chat_history is None:
+            self.chat_history = deque(maxlen=self.chat_history_size)
+        self.chat_history.append(line)
+
+    def record(self, message: str, is_event: bool) -> int:
+        self.seq += 1
+        if is_event:
+            if self.event_log is None:
+                self.event_log = deque(maxlen=self.event_log_size)
+            if len(self.event_log) == self.event_log.maxlen:
+                self.log_horizon = self.event_log[0][0] if self.event_log else self.seq
+            self.event_log.append((self.seq, message))
+        return self.seq
+
+    def events_since(self, seq: int) -> list[tuple[int, str]] | None:
+        # None when the log no longer reaches back that far
+        if seq < self.log_horizon:
+            return None
+        if self.event_log is None:
+            return []
+        return [(event_seq, message) for event_seq, message in self.event_log if event_seq > seq]
+
+    def add_player(self, username: str, connection) -> PlayerState:
+        player = self.players.get(username)
+        if player is None:
+            player = PlayerState(username, connection)
+            self.players[username] = player
+            self.seats.append(player)
+        else:
+            player.connection = connection
+            player.ready = False
+            player.position = 0
+        return player
+
+    def remove_player(self, username: str) -> PlayerState | None:
+        player = self.players.pop(username, None)
+        if player is None:
+            return None
+        seat = self.seats.index(player)
+        del self.seats[seat]
+        if self.turn_index >= 0:
+            if not self.seats:
+                self.turn_index = -1
+            elif seat < self.turn_index:
+                self.turn_index -= 1
+            elif self.turn_index >= len(self.seats):
+                self.turn_index = 0
+        return player
+
+    def usernames(self) -> list[str]:
+        return list(self.players)
+
+    def current_player(self) -> PlayerState | None:
+        if self.turn_index < 0:
+            return None
+        return self.seats[self.turn_index]
+
+    def all_ready(self) -> bool:
+        return len(self.seats) > 0 and all(player.ready for player in self.seats)
+
+    def is_empty(self) -> bool:
+        return not self.seats
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+
+# One timer wheel shared by every room. A timer lands in the slot of the tick it is due on, so
+# a tick only looks at that slot instead of at every room. Delays longer than a full turn of the
+# wheel just stay in their slot for another revolution.
+class TimerWheel:
+    def __init__(self, tick: float = 1.0, slots: int = 1024):
+        self.tick = tick
+        self.slots: list[dict] = [{} for _ in range(slots)]
+        self.timers: dict = {}
+        self.current_tick = 0
+        self.task: asyncio.Task | None = None
+
+    def schedule(self, key, delay: float, callback, *args):
+        self.cancel(key)
+        due_tick = self.current_tick + max(1, math.ceil(delay / self.tick))
+        slot = due_tick % len(self.slots)
+        self.slots[slot][key] = (due_tick, callback, args)
+        self.timers[key] = slot
+
+    def cancel(self, key):
+        slot = self.timers.pop(key, None)
+        if slot is not None:
+            del self.slots[slot][key]
+
+    def __len__(self):
+        return len(self.timers)
+
+    async def advance(self):
+        self.current_tick += 1
+        bucket = self.slots[self.current_tick % len(self.slots)]
+        due = [key for key, entry in bucket.items() if entry[0] <= self.current_tick]
+        for key in due:
+            # an earlier callback of this tick may have cancelled or rescheduled the timer
+            entry = bucket.get(key)
+            if entry is None or entry[0] > self.current_tick:
+                continue
+            del bucket[key]
+            del self.timers[key]
+            _, callback, args = entry
+            try:
+                await callback(*args)
+            except Exception:
+                logger.exception("timer %r failed", key)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        while True:
+            await asyncio.sleep(self.tick)
+            # catch up on ticks missed while the loop was busy instead of drifting
+            while self.current_tick < int((loop.time() - started) / self.tick):
+                try:
+                    await self.advance()
+                except Exception:
+                    # one broken tick must not stop every timer after it
+                    logger.exception("timer wheel tick %d failed", self.current_tick)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
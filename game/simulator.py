@@ -0,0 +1,113 @@
+import argparse
+import json
+import time
+from game import engine
+from game.room_state import RoomState, DETACHED
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Plays games headless to tune track_length and max_players and to measure how fast the rules
+# run. simulate_engine() plays each game through game/engine.py one roll at a time.
+# simulate_batch() plays the same rules on whole arrays of games with NumPy: a player's progress
+# does not depend on the others, so every roll of every game is drawn up front. The winner is the
+# player who reaches the goal in the earliest turn. A rule change in engine.roll has to be made
+# here too.
+
+# dice drawn per chunk of games, bounds the memory of a batch whatever the track length
+CHUNK_CELLS = 4_000_000
+
+
+def summarize(games: int, players: int, track_length: int, wins: list[int], turn_counts: list[int], seconds: float, mode: str) -> dict:
+    total = 0
+    p50 = p99 = 0
+    for turns, count in enumerate(turn_counts):
+        total += count
+        if not p50 and total >= games * 0.5:
+            p50 = turns
+        if not p99 and total >= games * 0.99:
+            p99 = turns
+    return {
+        "engine": mode,
+        "games": games,
+        "players": players,
+        "track_length": track_length,
+        "win_share_by_seat": [round(seat_wins / games, 4) for seat_wins in wins],
+        "mean_turns": sum(turns * count for turns, count in enumerate(turn_counts)) / games,
+        "p50_turns": p50,
+        "p99_turns": p99,
+        "max_turns": max(turns for turns, count in enumerate(turn_counts) if count),
+        "games_per_second": games / seconds if seconds else 0.0,
+    }
+
+
+def simulate_engine(games: int, players: int, track_length: int, seed: int | None = None) -> dict:
+    room = RoomState("simulation", players, track_length, seed=seed)
+    usernames = [f"player-{seat}" for seat in range(players)]
+    for username in usernames:
+        room.add_player(username, DETACHED)
+    seats = {username: seat for seat, username in enumerate(usernames)}
+    wins = [0] * players
+    turn_counts = [0] * (max(track_length - 1, 1) * players + 1)
+    started = time.perf_counter()
+    for _ in range(games):
+        engine.apply(room, (engine.STARTED, usernames[0], 0))
+        turns = 0
+        while room.current_player() is not None:
+            events = engine.roll(room, room.current_player().username)
+            engine.replay(room, events)
+            turns += 1
+        wins[seats[events[-1][1]]] += 1
+        turn_counts[turns] += 1
+    return summarize(games, players, track_length, wins, turn_counts, time.perf_counter() - started, "engine")
+
+
+def simulate_batch(games: int, players: int, track_length: int, seed: int | None = None) -> dict:
+    if numpy is None:
+        raise RuntimeError("the batch simulator needs numpy, install it with `pip install numpy`")
+    generator = numpy.random.default_rng(seed)
+    goal = max(track_length - 1, 0)
+    # every roll moves at least one field, nobody needs more rolls than that
+    rounds = max(goal, 1)
+    chunk = max(1, CHUNK_CELLS // (rounds * players))
+    seat_order = numpy.arange(players)
+    wins = numpy.zeros(players, dtype=numpy.int64)
+    turn_counts = numpy.zeros(rounds * players + 1, dtype=numpy.int64)
+    started = time.perf_counter()
+    for first in range(0, games, chunk):
+        size = min(chunk, games - first)
+        dice = generator.integers(1, engine.DICE_SIDES + 1, size=(size, rounds, players), dtype=numpy.int8)
+        finished = dice.cumsum(axis=1, dtype=numpy.int32) >= goal
+        # turn, counted from 0, in which each player reaches the goal
+        finish_turn = finished.argmax(axis=1) * players + seat_order
+        wins += numpy.bincount(finish_turn.argmin(axis=1), minlength=players)
+        turn_counts += numpy.bincount(finish_turn.min(axis=1) + 1, minlength=len(turn_counts))
+    seconds = time.perf_counter() - started
+    return summarize(games, players, track_length, wins.tolist(), turn_counts.tolist(), seconds, "batch")
+
+
+SIMULATORS = {"batch": simulate_batch, "engine": simulate_engine}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="plays games headless to tune the track length and room size")
+    parser.add_argument("--games", type=int, default=1_000_000)
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--track-length", type=int, nargs="+", default=[10, 15, 20])
+    parser.add_argument("--engine", choices=sorted(SIMULATORS), default="batch",
+                        help="batch plays the rules on arrays with numpy, engine plays them through game/engine.py")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    simulate = SIMULATORS[args.engine]
+    results = [
+        simulate(args.games, players, track_length, args.seed)
+        for track_length in args.track_length
+        for players in args.players
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from fastapi import WebSocket
+from game.outbound import OutboundQueue, snapshot_prefix
+from game.protocol import FrameEncoder, pack
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+# besides the snapshots, a spectator that starts watching needs to know whose turn it is
+TURN_PREFIXES = ("GAME_START:", "TURN_CHANGE:", "WIN:")
+TURN = "turn"
+# spectators written to before the fan-out gives the loop back to everybody else
+FANOUT_BATCH = 256
+
+spectator_resyncs = metrics.registry.counter("tte_spectator_resyncs_total", "Snapshots sent to spectators that joined or fell behind").labels()
+
+
+class SpectatorQueue(OutboundQueue):
+    def __init__(self, websocket: WebSocket, max_size: int = 16, v2: bool = False):
+        super().__init__(websocket, max_size)
+        self.v2 = v2
+        # set until the spectator got a snapshot to apply the shared frames to
+        self.stale = True
+
+    def push(self, message: str, seq: int | None = None) -> bool:
+        # whatever comes between falling behind and the next snapshot would not apply anyway
+        if self.stale:
+            return False
+        return super().push(message, seq)
+
+    def _make_room(self, message: str) -> bool:
+        # a spectator that falls behind is not worth queueing for, its backlog goes and the next
+        # flush sends it a fresh snapshot instead
+        self.dropped += len(self.messages)
+        self.messages.clear()
+        self.stale = True
+        return False
+
+
+# Read-only fan-out for the spectators of one room on this worker. Players never wait for it:
+# a broadcast only appends to the pending batch, and every `interval` seconds the batch is
+# encoded once and the same frame is handed to every spectator. Within a batch only the newest
+# snapshot of each kind is kept, so a busy room sends its watchers fewer position frames.
+# On the room's owner the batch is also relayed, once per worker, to workers with spectators.
+class SpectatorHub:
+    def __init__(self, room_id: str, backend, interval: float = 0.2):
+        self.room_id = room_id
+        self.backend = backend
+        self.interval = interval
+        self.spectators: dict[SpectatorQueue, None] = {}
+        # workers whose spectators get this room's batches from us
+        self.relays: set[str] = set()
+        self.pending: list[str] = []
+        # newest snapshot of each kind and turn message, what a new spectator is sent first
+        self.latest: dict[str, str] = {}
+        self.encoder = FrameEncoder()
+        self.scheduled = False
+
+    def __len__(self) -> int:
+        return len(self.spectators)
+
+    def is_empty(self) -> bool:
+        return not self.spectators and not self.relays
+
+    def seed(self, messages: list[str]):
+        for message in messages:
+            self._remember(message)
+
+    def add(self, spectator: SpectatorQueue):
+        self.spectators[spectator] = None
+        self._schedule()
+
+    def discard(self, spectator: SpectatorQueue):
+        self.spectators.pop(spectator, None)
+        spectator.close()
+
+    def publish(self, message: str):
+        prefix = snapshot_prefix(message)
+        if prefix is not None:
+            self.pending = [queued for queued in self.pending if not queued.startswith(prefix)]
+        self.pending.append(message)
+        self._schedule()
+
+    def _remember(self, message: str):
+        key = snapshot_prefix(message)
+        if key is None and message.startswith(TURN_PREFIXES):
+            key = TURN
+        if key is not None:
+            self.latest[key] = message
+
+    def _schedule(self):
+        if not self.scheduled:
+            self.scheduled = True
+            asyncio.get_running_loop().call_later(self.interval, lambda: asyncio.create_task(self.flush()))
+
+    async def flush(self):
+        try:
+            await self._fan_out()
+        except Exception:
+            # whatever the spectators got of this batch is unreliable, they all start over from a snapshot
+            logger.exception("could not send room %s to its spectators", self.room_id)
+            self.encoder = FrameEncoder()
+            for spectator in self.spectators:
+                spectator.stale = True
+        self.scheduled = False
+        if self.pending or (self.latest and any(spectator.stale for spectator in self.spectators)):
+            self._schedule()
+
+    async def _fan_out(self):
+        batch, self.pending = self.pending, []
+        for message in batch:
+            self._remember(message)
+        if batch:
+            for worker in self.relays:
+                self.backend.send_to_worker(worker, {"type": "spectate", "room_id": self.room_id, "messages": [pack(message) for message in batch]})
+        spectators = list(self.spectators)
+        frame = None
+        if any(spectator.v2 for spectator in spectators):
+            frame = self.encoder.encode(batch) if batch else None
+        else:
+            # nobody holds the delta state, the next v2 spectator starts from full snapshots
+            self.encoder = FrameEncoder()
+        snapshot = list(self.latest.values())
+        resync_v2 = FrameEncoder().encode(snapshot) if snapshot else None
+        for index, spectator in enumerate(spectators, 1):
+            if spectator.closed:
+                self.spectators.pop(spectator, None)
+            elif spectator.stale:
+                # before the owner's first batch reaches another worker there is nothing to send yet
+                if snapshot:
+                    spectator.stale = False
+                    spectator_resyncs.inc()
+                    if spectator.v2:
+                        spectator.push(resync_v2)
+                    else:
+                        for message in snapshot:
+                            spectator.push(message)
+            elif spectator.v2:
+                if frame is not None:
+                    spectator.push(frame)
+            else:
+                for message in batch:
+                    spectator.push(message)
+            if index % FANOUT_BATCH == 0:
+                await asyncio.sleep(0)
+
+    def close(self, code: int | None = None):
+        for spectator in self.spectators:
+            spectator.close(code)
+        self.spectators.clear()
+        for worker in self.relays:
+            self.backend.send_to_worker(worker, {"type": "spectate_close", "room_id": self.room_id, "code": code})
+        self.relays.clear()
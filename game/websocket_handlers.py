@@ -1,161 +1,527 @@
 from fastapi import WebSocket
-import random
-from database import DB_main as dbm
+import asyncio
+import secrets
+from database.stats_writer import stats_writer
+from game.outbound import OutboundQueue, DROP_OLDEST, snapshot_prefix
+from game.backends import RoomBackend, RemoteConnection, create_backend
+from game.room_state import RoomState, DETACHED
+from game.lobby import SORT_NAME
+from game.protocol import FrameEncoder, PROTOCOL_V2, Snapshot, negotiate, pack, unpack
+from game.scheduler import TimerWheel
+from game import engine
+from game.chat import TokenBucket, chat_lines_message
+from game.spectators import SpectatorHub, SpectatorQueue
+from monitoring import metrics
 import time
+import os
+
+TURN_TIMEOUT_ROLL = "roll"
+TURN_TIMEOUT_SKIP = "skip"
+TURN_TIMEOUT_ACTIONS = (TURN_TIMEOUT_ROLL, TURN_TIMEOUT_SKIP)
+
+IDLE_ROOM_CLOSE_CODE = 1001
+ROOM_LIMIT_CLOSE_CODE = 1013
+# the client closed on purpose, its seat is not kept for a reconnect
+DELIBERATE_CLOSE_CODES = (1000, 1001)
+
+READY_TOGGLE_SECONDS = metrics.event_seconds.labels("ready_toggle")
+ROLL_DICE_SECONDS = metrics.event_seconds.labels("roll_dice")
+CHAT_SECONDS = metrics.event_seconds.labels("chat")
+sessions = metrics.registry.counter("tte_ws_sessions_total", "Seats kept for a reconnect and what became of them", ("outcome",))
+SESSIONS_DETACHED, SESSIONS_RESUMED, SESSIONS_EXPIRED = sessions.labels("detached"), sessions.labels("resumed"), sessions.labels("expired")
+
+
+def player_list_message(room: RoomState) -> Snapshot:
+    usernames = room.usernames()
+    return Snapshot(f"PLAYERLIST:{','.join(usernames)}", "players", usernames)
+
+
+def ready_status_message(room: RoomState) -> Snapshot:
+    status_list = [f"{player.username}:{('ready' if player.ready else 'not_ready')}" for player in room.seats]
+    return Snapshot(f"READY_STATUS:{','.join(status_list)}", "ready", {player.username: player.ready for player in room.seats})
+
+
+def positions_message(room: RoomState) -> Snapshot:
+    position_list = [f"{player.username}:{player.position}" for player in room.seats]
+    return Snapshot(f"PLAYER_POSITIONS:{','.join(position_list)}", "pos", {player.username: player.position for player in room.seats})
+
+
+def room_snapshot(room: RoomState) -> list[str]:
+    messages = [player_list_message(room), ready_status_message(room), positions_message(room)]
+    current = room.current_player()
+    if current is not None:
+        messages.append(f"TURN_CHANGE:{current.username}")
+    return messages
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[str, dict[str, WebSocket]] = {}
-        self.room_config: dict[str, dict] = {}
-        self.player_ready_status: dict[str, dict[str, bool]] = {}
-        self.player_positions: dict[str, dict[str, int]] = {}
-        self.current_turn: dict[str, str] = {}
-
-    async def create_room(self, room_id: str, max_players: int = 4, track_length: int = 15):
-        self.room_config[room_id] = {"max_players": max_players, "track_length": track_length, "start_time": 0}
-        self.player_ready_status[room_id] = {}
-        self.player_positions[room_id] = {}
-
-    async def connect(self, websocket: WebSocket, room_id: str, username: str):
-        await websocket.accept()
-        if room_id not in self.active_connections:
-            self.active_connections[room_id] = {}
-        self.active_connections[room_id][username] = websocket
-
-        if room_id not in self.player_ready_status:
-            self.player_ready_status[room_id] = {}
-        self.player_ready_status[room_id][username] = False
-
-        if room_id not in self.player_positions:
-            self.player_positions[room_id] = {}
-        self.player_positions[room_id][username] = 0
-
-    def disconnect(self, room_id: str, username: str):
-        if room_id in self.active_connections:
-            self.active_connections[room_id].pop(username, None)
-            if room_id in self.player_ready_status:
-                self.player_ready_status[room_id].pop(username, None)
-            if room_id in self.player_positions:
-                self.player_positions[room_id].pop(username, None)
-
-            if not self.active_connections[room_id]:
-                del self.active_connections[room_id]
-                del self.room_config[room_id]
-                if room_id in self.player_ready_status:
-                    del self.player_ready_status[room_id]
-                if room_id in self.player_positions:
-                    del self.player_positions[room_id]
+    def __init__(self, send_queue_size: int = 64, overflow_policy: str = DROP_OLDEST, backend: RoomBackend | None = None,
+                 turn_timeout: float = 30, turn_timeout_action: str = TURN_TIMEOUT_ROLL, empty_room_timeout: float = 120,
+                 idle_room_timeout: float = 1800, max_rooms: int = 10000, tick: float = 1.0,
+                 chat_rate: float = 2, chat_burst: float = 5, chat_history_size: int = 50, chat_coalesce: float = 0,
+                 reconnect_grace: float = 30, event_log_size: int = 64, spectator_interval: float = 0.2,
+                 spectator_queue_size: int = 16, seed: int | None = None):
+        if turn_timeout_action not in TURN_TIMEOUT_ACTIONS:
+            raise ValueError(f"unknown turn timeout action: {turn_timeout_action}")
+        # a timeout of 0 turns that timer off
+        self.turn_timeout = turn_timeout
+        self.turn_timeout_action = turn_timeout_action
+        self.empty_room_timeout = empty_room_timeout
+        self.idle_room_timeout = idle_room_timeout
+        self.max_rooms = max_rooms
+        # chat_rate is messages per second per player, 0 turns the limit off; chat_coalesce is the
+        # window in seconds that collects a burst of chat into one message, 0 sends every line at once
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_history_size = chat_history_size
+        self.chat_coalesce = chat_coalesce
+        # how long a dropped player's seat waits for them, 0 frees it at once
+        self.reconnect_grace = reconnect_grace
+        self.event_log_size = event_log_size
+        # spectators get the room's broadcasts in one shared frame per interval, a spectator with
+        # spectator_queue_size frames unsent is skipped ahead to a fresh snapshot
+        self.spectator_interval = spectator_interval
+        self.spectator_queue_size = spectator_queue_size
+        # with a seed every room rolls the same dice each run, without one each room draws its own
+        self.seed = seed
+        self.scheduler = TimerWheel(tick)
+        self.send_queue_size = send_queue_size
+        self.overflow_policy = overflow_policy
+        self.backend = backend if backend is not None else RoomBackend()
+        self.rooms: dict[str, RoomState] = {}
+        # sockets on this worker whose room is owned by another worker
+        self.remote_players: dict[tuple[str, str], OutboundQueue] = {}
+        # spectators on this worker by room, on the owner also the workers the room is relayed to
+        self.spectators: dict[str, SpectatorHub] = {}
 
-    async def broadcast_to_room(self, message: str, room_id: str):
-        if room_id in self.active_connections:
-            for connection in self.active_connections[room_id].values():
-                await connection.send_text(message)
+    async def start(self):
+        await self.backend.start(self)
+        self.scheduler.start()
 
-    def get_room_players(self, room_id: str) -> list[str]:
-        return list(self.active_connections.get(room_id, {}).keys())
-
-    def get_rooms(self):
-        rooms = []
-        for connection in self.active_connections.items():
-            rooms.append(
-                {
-                    "room_id": connection[0],
-                    "player_count": len(connection[1]),
-                    "max_players": int(self.room_config[connection[0]]["max_players"])
-                }
-            )
-        return rooms
+    async def stop(self):
+        await self.scheduler.stop()
+        await self.backend.stop()
 
-    async def toggle_ready(self, room_id: str, username: str):
-        if room_id in self.player_ready_status and username in self.player_ready_status[room_id]:
-            self.player_ready_status[room_id][username] = not self.player_ready_status[room_id][username]
-            await self.broadcast_ready_status(room_id)
-            if self.are_all_players_ready(room_id):
-                await self.start_game(room_id)
-
-    def are_all_players_ready(self, room_id: str):
-        if room_id not in self.player_ready_status:
+    async def create_room(self, room_id: str, max_players: int = 4, track_length: int = 15) -> bool:
+        # creating a room that already exists just sends the creator to it, the players keep their seats
+        if not self.backend.is_local(room_id) or room_id in self.rooms:
+            return True
+        if len(self.rooms) >= self.max_rooms or not self.backend.can_create_rooms():
             return False
+        seed = secrets.randbits(64) if self.seed is None else f"{self.seed}:{room_id}"
+        self.rooms[room_id] = RoomState(room_id, max_players, track_length, self.chat_history_size, self.event_log_size, seed)
+        self.update_directory(room_id)
+        self.schedule_expiry(room_id, self.empty_room_timeout)
+        return True
 
-        statuses = self.player_ready_status[room_id]
-        return len(statuses) > 0 and all(statuses.values())
+    def drop_room(self, room_id: str):
+        room = self.rooms.pop(room_id)
+        self.backend.remove_room(room_id)
+        self.scheduler.cancel(("idle", room_id))
+        self.scheduler.cancel(("turn", room_id))
+        for username in room.players:
+            self.scheduler.cancel(("grace", room_id, username))
+        hub = self.spectators.pop(room_id, None)
+        if hub is not None:
+            hub.close(IDLE_ROOM_CLOSE_CODE)
 
+    def schedule_expiry(self, room_id: str, delay: float):
+        if delay > 0:
+            self.scheduler.schedule(("idle", room_id), delay, self.expire_room, room_id)
 
-    async def start_game(self, room_id: str):
-        players = self.get_room_players(room_id)
-        if players:
-            first_player = players[0]
-            self.current_turn[room_id] = first_player
-            await self.broadcast_to_room(f"GAME_START:{first_player}", room_id)
-        for username in self.get_room_players(room_id):
-            self.player_positions[room_id][username]=0
-        self.room_config[room_id]["start_time"] = time.time()
+    async def expire_room(self, room_id: str):
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+        timeout = self.empty_room_timeout if room.is_empty() else self.idle_room_timeout
+        if timeout <= 0:
+            return
+        # activity only stamps the room, the timer checks the stamp when it fires and goes back to sleep
+        remaining = room.last_activity + timeout - time.monotonic()
+        if remaining > 0:
+            self.schedule_expiry(room_id, remaining)
+            return
+        self.drop_room(room_id)
+        for player in room.seats:
+            player.connection.close(IDLE_ROOM_CLOSE_CODE)
 
+    def update_directory(self, room_id: str):
+        room = self.rooms[room_id]
+        self.backend.set_room(room_id, room.usernames(), int(room.max_players), room.track_length)
 
-    async def broadcast_ready_status(self, room_id: str):
-        if room_id in self.player_ready_status:
-            status_list = [
-                f"{username}:{('ready' if ready else 'not_ready')}"
-                for username, ready in self.player_ready_status[room_id].items()
-            ]
-            await self.broadcast_to_room(f"READY_STATUS:{','.join(status_list)}", room_id)
+    async def join(self, websocket: WebSocket, room_id: str, username: str, resume: str | None = None) -> OutboundQueue:
+        protocol = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=protocol)
+        encoder = FrameEncoder() if protocol == PROTOCOL_V2 else None
+        connection = OutboundQueue(websocket, self.send_queue_size, self.overflow_policy, encoder)
+        if self.backend.is_local(room_id):
+            await self.add_player(room_id, username, connection, resume)
+        else:
+            previous = self.remote_players.pop((room_id, username), None)
+            seen = None
+            if previous is not None:
+                seen = previous.sent_seq
+                previous.close()
+            self.remote_players[(room_id, username)] = connection
+            self.backend.send_to_owner(
+                room_id,
+                {"type": "join", "room_id": room_id, "username": username, "worker": self.backend.worker_id, "resume": resume, "seen": seen},
+            )
+        return connection
 
-    async def broadcast_player_positions(self, room_id: str):
-        if room_id in self.player_positions:
-            position_list = [
-                f"{username}:{position}"
-                for username, position in self.player_positions[room_id].items()
-            ]
-            await self.broadcast_to_room(f"PLAYER_POSITIONS:{','.join(position_list)}", room_id)
+    async def watch(self, websocket: WebSocket, room_id: str) -> SpectatorQueue:
+        protocol = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=protocol)
+        spectator = SpectatorQueue(websocket, self.spectator_queue_size, protocol == PROTOCOL_V2)
+        if self.backend.get_room(room_id) is None:
+            spectator.close(IDLE_ROOM_CLOSE_CODE)
+            return spectator
+        hub = self.spectators.get(room_id)
+        if hub is None:
+            hub = self.spectator_hub(room_id)
+            if not self.backend.is_local(room_id):
+                self.backend.send_to_owner(room_id, {"type": "watch", "room_id": room_id, "worker": self.backend.worker_id})
+        hub.add(spectator)
+        return spectator
 
-    async def handle_dice_roll(self, room_id: str, username: str):
-        if room_id not in self.current_turn or self.current_turn[room_id] != username:
+    def spectator_hub(self, room_id: str) -> SpectatorHub:
+        hub = self.spectators.get(room_id)
+        if hub is None:
+            hub = self.spectators[room_id] = SpectatorHub(room_id, self.backend, self.spectator_interval)
+            room = self.rooms.get(room_id)
+            if room is not None:
+                hub.seed(room_snapshot(room))
+        return hub
+
+    def unwatch(self, room_id: str, spectator: SpectatorQueue):
+        hub = self.spectators.get(room_id)
+        if hub is None:
             return
-        dice_result = random.randint(1, 6)
+        hub.discard(spectator)
+        if hub.is_empty():
+            del self.spectators[room_id]
+            if not self.backend.is_local(room_id):
+                self.backend.send_to_owner(room_id, {"type": "unwatch", "room_id": room_id, "worker": self.backend.worker_id})
 
-        if room_id in self.player_positions and username in self.player_positions[room_id]:
-            old_position = self.player_positions[room_id][username]
-            new_position = old_position + dice_result
-            if new_position < self.room_config[room_id]["track_length"]-1:
-                self.player_positions[room_id][username] = new_position
-                await self.broadcast_player_positions(room_id)
-                await self.next_turn(room_id)
-            else:
-                await self.win(room_id, username)
-                self.player_positions[room_id][username] = self.room_config[room_id]["track_length"]-1
-                await self.broadcast_player_positions(room_id)
+    async def receive(self, room_id: str, username: str, data: str):
+        if metrics.registry.enabled:
+            metrics.ws_messages_in.inc()
+            metrics.ws_bytes_in.inc(len(data.encode()))
+        if (room_id, username) in self.remote_players:
+            self.backend.send_to_owner(room_id, {"type": "event", "room_id": room_id, "username": username, "data": data})
+        else:
+            await self.handle_event(room_id, username, data)
+
+    async def leave(self, room_id: str, username: str, connection: OutboundQueue, code: int | None = None):
+        if self.remote_players.get((room_id, username)) is connection:
+            del self.remote_players[(room_id, username)]
+            connection.close()
+            if self.backend.get_room(room_id) is not None:
+                self.backend.send_to_owner(
+                    room_id,
+                    {"type": "leave", "room_id": room_id, "username": username, "worker": self.backend.worker_id, "code": code, "seen": connection.sent_seq},
+                )
+            return
+        room = self.rooms.get(room_id)
+        player = room.players.get(username) if room is not None else None
+        # a socket that was already replaced by a reconnect must not take the seat with it
+        if player is not None and player.connection is connection:
+            await self.detach_player(room_id, username, code)
 
-    async def next_turn(self, room_id: str):
-        players = self.get_room_players(room_id)
-        if not players or room_id not in self.current_turn:
+    async def detach_player(self, room_id: str, username: str, code: int | None = None, seen: int | None = None):
+        room = self.rooms[room_id]
+        player = room.players[username]
+        if self.reconnect_grace <= 0 or code in DELIBERATE_CLOSE_CODES:
+            await self.remove_player(room_id, username)
             return
+        # the seat, ready flag and position stay, nobody else hears about the drop unless it lasts
+        player.saw(getattr(player.connection, "sent_seq", seen))
+        player.connection.close()
+        player.connection = DETACHED
+        SESSIONS_DETACHED.inc()
+        self.scheduler.schedule(("grace", room_id, username), self.reconnect_grace, self.expire_session, room_id, username)
 
-        current_player = self.current_turn[room_id]
-        current_index = players.index(current_player) if current_player in players else -1
-        next_index = (current_index + 1) % len(players)
-        next_player = players[next_index]
+    async def expire_session(self, room_id: str, username: str):
+        room = self.rooms.get(room_id)
+        player = room.players.get(username) if room is not None else None
+        if player is not None and player.is_detached():
+            SESSIONS_EXPIRED.inc()
+            await self.remove_player(room_id, username)
 
-        self.current_turn[room_id] = next_player
-        await self.broadcast_to_room(f"TURN_CHANGE:{next_player}", room_id)
+    async def handle_backend_message(self, message: dict):
+        kind = message["type"]
+        room_id = message["room_id"]
+        username = message.get("username")
+        if kind == "join":
+            connection = RemoteConnection(self.backend, message["worker"], room_id, username)
+            await self.add_player(room_id, username, connection, message.get("resume"), message.get("seen"))
+        elif kind == "event":
+            await self.handle_event(room_id, username, message["data"])
+        elif kind == "leave":
+            room = self.rooms.get(room_id)
+            player = room.players.get(username) if room is not None else None
+            if player is not None and getattr(player.connection, "worker_id", None) == message.get("worker"):
+                await self.detach_player(room_id, username, message.get("code"), message.get("seen"))
+        elif kind == "deliver":
+            connection = self.remote_players.get((room_id, username))
+            if connection is not None:
+                connection.push(unpack(message["message"]), message.get("seq"))
+        elif kind == "close":
+            connection = self.remote_players.pop((room_id, username), None)
+            if connection is not None:
+                connection.close(message["code"])
+        elif kind == "watch":
+            room = self.rooms.get(room_id)
+            if room is None:
+                self.backend.send_to_worker(message["worker"], {"type": "spectate_close", "room_id": room_id, "code": IDLE_ROOM_CLOSE_CODE})
+                return
+            self.spectator_hub(room_id).relays.add(message["worker"])
+            # later batches follow from the hub, this gives the worker's spectators something to start from
+            self.backend.send_to_worker(message["worker"], {"type": "spectate", "room_id": room_id, "messages": [pack(snapshot) for snapshot in room_snapshot(room)]})
+        elif kind == "unwatch":
+            hub = self.spectators.get(room_id)
+            if hub is not None:
+                hub.relays.discard(message["worker"])
+                if hub.is_empty():
+                    del self.spectators[room_id]
+        elif kind == "spectate":
+            hub = self.spectators.get(room_id)
+            if hub is not None:
+                for spectated in message["messages"]:
+                    hub.publish(unpack(spectated))
+        elif kind == "spectate_close":
+            hub = self.spectators.pop(room_id, None)
+            if hub is not None:
+                hub.close(message["code"])
 
-    async def add_stats(self, room_id: str, winner: str, game_time: int = 0):
-        #print("in stats")
-        game_id = time.time_ns()
-        dbm.add_game(game_id=game_id, game_time=game_time, player_count=len(self.get_room_players(room_id)))
-        for username in self.get_room_players(room_id):
-            #print(username)
-            if username == winner:
-                #print("is winner")
-                dbm.add_game_user(game_id=game_id, user_id=username, winner=True)
-            else:
-                #print("is not winner")
-                dbm.add_game_user(game_id=game_id, user_id=username, winner=False)
+    async def add_player(self, room_id: str, username: str, connection: OutboundQueue | RemoteConnection, resume: str | None = None, seen: int | None = None):
+        if room_id not in self.rooms and not await self.create_room(room_id):
+            connection.close(ROOM_LIMIT_CLOSE_CODE)
+            return
+        room = self.rooms[room_id]
+        room.touch()
+        previous = room.players.get(username)
+        if previous is not None and resume is not None and secrets.compare_digest(resume, previous.resume_token or ""):
+            self.resume_player(room, previous, connection, seen)
+            return
+        if previous is not None:
+            previous.connection.close()
+            self.scheduler.cancel(("grace", room_id, username))
+        player = room.add_player(username, connection)
+        # the join hands over the whole state, a resume only has to replay what comes after it
+        player.seen_seq = room.seq
+        player.resume_token = secrets.token_urlsafe(16)
+        connection.push(f"SESSION:{player.resume_token}")
+        if player.chat_bucket is None and self.chat_rate > 0:
+            player.chat_bucket = TokenBucket(self.chat_rate, self.chat_burst)
+        if room.chat_history:
+            connection.push(chat_lines_message(room.chat_history))
+        self.update_directory(room_id)
+        await self.broadcast_to_room(f" {username} joined the room", room_id)
+        await self.broadcast_to_room(player_list_message(room), room_id)
+        await self.broadcast_ready_status(room_id)
+        await self.broadcast_player_positions(room_id)
+
+    def resume_player(self, room: RoomState, player, connection: OutboundQueue | RemoteConnection, seen: int | None = None):
+        self.scheduler.cancel(("grace", room.room_id, player.username))
+        if player.is_detached():
+            SESSIONS_RESUMED.inc()
+        else:
+            # the old socket has not noticed it is dead yet, whatever it still had queued never arrived
+            player.saw(getattr(player.connection, "sent_seq", seen))
+            player.connection.close()
+        player.connection = connection
+        # only the returning player hears about it: the events it missed, then the current state
+        missed = room.events_since(player.seen_seq)
+        if missed is None:
+            if room.chat_history:
+                connection.push(chat_lines_message(room.chat_history))
+        else:
+            for seq, message in missed:
+                connection.push(message, seq)
+        connection.push(player_list_message(room))
+        connection.push(ready_status_message(room))
+        connection.push(positions_message(room))
+        current = room.current_player()
+        if current is not None:
+            connection.push(f"TURN_CHANGE:{current.username}")
+
+    async def handle_event(self, room_id: str, username: str, data: str):
+        room = self.rooms.get(room_id)
+        if room is not None:
+            room.touch()
+        if data == "READY_TOGGLE":
+            timer = READY_TOGGLE_SECONDS
+            started = timer.start()
+            await self.toggle_ready(room_id, username)
+        elif data == "ROLL_DICE":
+            timer = ROLL_DICE_SECONDS
+            started = timer.start()
+            await self.handle_dice_roll(room_id, username)
+        else:
+            timer = CHAT_SECONDS
+            started = timer.start()
+            await self.handle_chat(room_id, username, data)
+        timer.stop(started)
+
+    async def handle_chat(self, room_id: str, username: str, data: str):
+        room = self.rooms.get(room_id)
+        player = room.players.get(username) if room is not None else None
+        if player is None:
+            return
+        bucket = player.chat_bucket
+        if bucket is not None:
+            if not bucket.allow():
+                if not bucket.limited:
+                    bucket.limited = True
+                    player.connection.push(" You are sending messages too fast, some were not delivered")
+                return
+            bucket.limited = False
+        line = f" {username}: {data}"
+        room.add_chat(line)
+        if self.chat_coalesce <= 0:
+            await self.broadcast_to_room(line, room_id)
+            return
+        if room.chat_pending is None:
+            room.chat_pending = []
+            asyncio.get_running_loop().call_later(self.chat_coalesce, lambda: asyncio.create_task(self.flush_chat(room)))
+        room.chat_pending.append(line)
+
+    async def flush_chat(self, room: RoomState):
+        lines, room.chat_pending = room.chat_pending, None
+        if lines and self.rooms.get(room.room_id) is room:
+            await self.broadcast_to_room(lines[0] if len(lines) == 1 else chat_lines_message(lines), room.room_id)
+
+    async def remove_player(self, room_id: str, username: str):
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+        had_turn = room.current_player() is not None and room.current_player().username == username
+        self.scheduler.cancel(("grace", room_id, username))
+        player = room.remove_player(username)
+        if player is not None:
+            player.connection.close()
+        if room.is_empty():
+            self.drop_room(room_id)
+            return
+        await self.broadcast_to_room(f" {username} left the room", room_id)
+        self.update_directory(room_id)
+        await self.broadcast_to_room(player_list_message(room), room_id)
+        await self.broadcast_ready_status(room_id)
         await self.broadcast_player_positions(room_id)
+        if had_turn and room.current_player() is not None:
+            await self.broadcast_to_room(f"TURN_CHANGE:{room.current_player().username}", room_id)
+            self.schedule_turn(room_id)
+
+    async def broadcast_to_room(self, message: str, room_id: str):
+        room = self.rooms.get(room_id)
+        if room is not None:
+            seq = room.record(message, snapshot_prefix(message) is None)
+            started = metrics.ws_broadcast_seconds.start()
+            for player in room.seats:
+                player.connection.push(message, seq)
+            metrics.ws_broadcast_seconds.stop(started)
+            hub = self.spectators.get(room_id)
+            if hub is not None:
+                hub.publish(message)
+
+    def get_room_players(self, room_id: str) -> list[str]:
+        room = self.rooms.get(room_id)
+        return room.usernames() if room is not None else []
+
+    def get_room_info(self, room_id: str) -> dict | None:
+        return self.backend.get_room(room_id)
+
+    def query_rooms(self, prefix: str = "", open_only: bool = False, sort: str = SORT_NAME, page: int = 1, page_size: int = 20) -> dict:
+        return self.backend.lobby.query(prefix, open_only, sort, page, page_size)
+
+    def rooms_etag(self) -> str:
+        return self.backend.lobby.etag
 
-    async def win(self, room_id: str, username: str):
-        await self.broadcast_to_room(f"WIN:{username}", room_id)
-        game_time = time.time() - self.room_config[room_id]["start_time"]
-        await self.add_stats(room_id=room_id, winner=username, game_time=game_time)
+    async def toggle_ready(self, room_id: str, username: str):
+        room = self.rooms.get(room_id)
+        if room is not None:
+            await self.play(room_id, engine.toggle_ready(room, username))
+
+    async def handle_dice_roll(self, room_id: str, username: str):
+        room = self.rooms.get(room_id)
+        if room is not None:
+            await self.play(room_id, engine.roll(room, username))
+
+    async def play(self, room_id: str, events: list[tuple]):
+        # the engine decides, this applies its events to the room and tells the sockets about them
+        room = self.rooms[room_id]
+        for event in events:
+            engine.apply(room, event)
+            kind, username, value = event
+            if kind == engine.READY:
+                await self.broadcast_ready_status(room_id)
+            elif kind == engine.STARTED:
+                room.start_time = time.time()
+                metrics.games_started.inc()
+                await self.broadcast_to_room(f"GAME_START:{username}", room_id)
+                self.schedule_turn(room_id)
+            elif kind == engine.MOVED:
+                await self.broadcast_player_positions(room_id)
+            elif kind == engine.TURN:
+                await self.broadcast_to_room(f"TURN_CHANGE:{username}", room_id)
+                self.schedule_turn(room_id)
+            elif kind == engine.WON:
+                self.scheduler.cancel(("turn", room_id))
+                metrics.games_finished.inc()
+                await self.broadcast_to_room(f"WIN:{username}", room_id)
+                await self.add_stats(room_id=room_id, winner=username, game_time=time.time() - room.start_time)
+
+    async def broadcast_ready_status(self, room_id: str):
+        room = self.rooms.get(room_id)
+        if room is not None:
+            await self.broadcast_to_room(ready_status_message(room), room_id)
+
+    async def broadcast_player_positions(self, room_id: str):
+        room = self.rooms.get(room_id)
+        if room is not None:
+            await self.broadcast_to_room(positions_message(room), room_id)
+
+    def schedule_turn(self, room_id: str):
+        player = self.rooms[room_id].current_player()
+        if player is not None and self.turn_timeout > 0:
+            self.scheduler.schedule(("turn", room_id), self.turn_timeout, self.turn_timed_out, room_id, player.username)
+
+    async def turn_timed_out(self, room_id: str, username: str):
+        room = self.rooms.get(room_id)
+        if room is None or room.current_player() is None or room.current_player().username != username:
+            return
+        await self.broadcast_to_room(f" {username} ran out of time", room_id)
+        if self.turn_timeout_action == TURN_TIMEOUT_ROLL:
+            await self.play(room_id, engine.roll(room, username))
+        else:
+            await self.play(room_id, engine.skip(room, username))
+
+    async def add_stats(self, room_id: str, winner: str, game_time: int = 0):
+        stats_writer.submit(game_id=time.time_ns(), game_time=game_time, players=self.get_room_players(room_id), winner=winner)
+        await self.broadcast_player_positions(room_id)
 
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager(
+    send_queue_size=int(os.environ.get("WS_SEND_QUEUE_SIZE", 64)),
+    overflow_policy=os.environ.get("WS_OVERFLOW_POLICY", DROP_OLDEST),
+    backend=create_backend(),
+    turn_timeout=float(os.environ.get("TURN_TIMEOUT_SECONDS", 30)),
+    turn_timeout_action=os.environ.get("TURN_TIMEOUT_ACTION", TURN_TIMEOUT_ROLL),
+    empty_room_timeout=float(os.environ.get("EMPTY_ROOM_TIMEOUT_SECONDS", 120)),
+    idle_room_timeout=float(os.environ.get("IDLE_ROOM_TIMEOUT_SECONDS", 1800)),
+    max_rooms=int(os.environ.get("MAX_ROOMS", 10000)),
+    chat_rate=float(os.environ.get("CHAT_RATE", 2)),
+    chat_burst=float(os.environ.get("CHAT_BURST", 5)),
+    chat_history_size=int(os.environ.get("CHAT_HISTORY_SIZE", 50)),
+    chat_coalesce=float(os.environ.get("CHAT_COALESCE_MS", 0)) / 1000,
+    reconnect_grace=float(os.environ.get("RECONNECT_GRACE_SECONDS", 30)),
+    event_log_size=int(os.environ.get("EVENT_LOG_SIZE", 64)),
+    spectator_interval=float(os.environ.get("SPECTATOR_INTERVAL_MS", 200)) / 1000,
+    spectator_queue_size=int(os.environ.get("SPECTATOR_QUEUE_SIZE", 16)),
+    seed=int(os.environ["GAME_SEED"]) if os.environ.get("GAME_SEED") else None,
+)
+metrics.registry.gauge("tte_rooms", "Rooms held by this worker", lambda: len(manager.rooms))
+metrics.registry.gauge("tte_players", "Players seated in rooms held by this worker", lambda: sum(len(room.seats) for room in manager.rooms.values()))
+metrics.registry.gauge("tte_remote_players", "Sockets on this worker playing in another worker's room", lambda: len(manager.remote_players))
+metrics.registry.gauge("tte_spectators", "Spectators watching rooms through this worker", lambda: sum(len(hub) for hub in manager.spectators.values()))
+metrics.registry.gauge("tte_scheduled_timers", "Pending turn and room expiry timers", lambda: len(manager.scheduler))
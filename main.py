@@ -1,42 +1,68 @@
-from fastapi import FastAPI, Request, Depends, Form, responses, WebSocket, WebSocketDisconnect, Path
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Depends, Form, responses, WebSocket, WebSocketDisconnect, Path, Query, Response
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import EmailStr
 import auth.auth as auth
 from datetime import timedelta, datetime
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from database import DB_main as dbm
+from database import DB_async as dba
+from database.database import get_async_session, pool_metrics, async_engine, auto_migrate, create_db_and_tables
+from sqlmodel.ext.asyncio.session import AsyncSession
 from game.websocket_handlers import manager
+from database.stats_writer import stats_writer
+from database.leaderboard import leaderboard
+from contextlib import asynccontextmanager
+from typing import Literal
+from web.static_cache import StaticAssets, PrerenderedPages
+from monitoring import metrics
+import asyncio
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if auto_migrate:
+        await asyncio.to_thread(create_db_and_tables)
+    static_assets.load()
+    pages.render_all()
+    stats_writer.start()
+    leaderboard.start()
+    await manager.start()
+    lag_sampler = asyncio.create_task(metrics.sample_loop_lag()) if metrics.registry.enabled else None
+    yield
+    if lag_sampler is not None:
+        lag_sampler.cancel()
+    await manager.stop()
+    await leaderboard.stop()
+    await stats_writer.stop()
+    await async_engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
+static_assets = StaticAssets(directory="static")
+templates.env.globals["static_url"] = static_assets.url
+
+# pages that render the same for everybody, served pre-rendered
+pages = PrerenderedPages(templates, {
+    "index.html": {},
+    "login.html": {"value": "", "username": ""},
+    "register.html": {"register_response": ""},
+})
+
+@app.get("/static/{path:path}")
+async def static(request: Request, path: str):
+    return static_assets.response(request, path)
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
-    return templates.TemplateResponse(
-        request=request,
-        name="index.html"
-    )
+    return pages.response(request, "index.html")
 
 @app.get("/login", response_class=HTMLResponse)
 async def login(request: Request):
-    return templates.TemplateResponse(
-        request=request,
-        name="login.html",
-        context={"value": "",
-                 "username": ""}
-    )
+    return pages.response(request, "login.html")
 
 @app.get("/register", response_class=HTMLResponse)
 async def register(request: Request):
-    return templates.TemplateResponse(
-        request=request,
-        name="register.html",
-        context={"register_response": ""}
-    )
+    return pages.response(request, "register.html")
 
 @app.post("/register")
 async def create_user(request: Request,
@@ -50,7 +76,7 @@ async def create_user(request: Request,
         if register_password != register_confirm_password:
             return_value = "Passwords do not match"
         else:
-            return_value = auth.create_user(register_username, register_password, register_email)
+            return_value = await auth.create_user(register_username, register_password, register_email)
 
     return templates.TemplateResponse(
     request=request,
@@ -59,26 +85,65 @@ async def create_user(request: Request,
     )
 
 @app.get("/account", response_class=HTMLResponse)
-def account(request:Request, user :str = Depends(auth.get_current_user), game_error: str | None = None):
+async def account(request:Request, user :str = Depends(auth.get_current_user), game_error: str | None = None, session: AsyncSession = Depends(get_async_session)):
     username = user.username
     if not game_error:
         game_error = ""
+    stats = await dba.select_user_stats(username, session)
+    games = stats.games if stats else 0
+    wins = stats.wins if stats else 0
+    mean_game_time = stats.total_game_time / stats.games if stats and stats.games else None
     return templates.TemplateResponse(
         request=request,
         name="account.html",
         context={"username": username,
                  "email": user.email,
-                 "games": dbm.select_game_count_by_username(username),
-                 "wins": dbm.select_won_games_count_by_username(username),
-                 "mean_game_time": f"{dbm.select_mean_game_time_by_username(username)} s",
-                 "rooms": manager.get_rooms(),
+                 "games": games,
+                 "wins": wins,
+                 "mean_game_time": f"{mean_game_time} s",
+                 "rooms": manager.query_rooms()["rooms"],
                  "game_error": game_error
                  }
     )
 
+@app.get("/rooms")
+async def list_rooms(request: Request,
+                     user: str = Depends(auth.get_current_user),
+                     prefix: str = "",
+                     open_only: bool = False,
+                     sort: Literal["name", "fill"] = "name",
+                     page: int = Query(1, ge=1),
+                     page_size: int = Query(20, ge=1, le=100)):
+    # runs on the event loop, the lobby index is only ever touched from there
+    etag = manager.rooms_etag()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(
+        manager.query_rooms(prefix=prefix, open_only=open_only, sort=sort, page=page, page_size=page_size),
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+@app.get("/leaderboard")
+async def get_leaderboard(metric: Literal["wins", "win_rate", "mean_time"] = "wins",
+                          cursor: str | None = None,
+                          limit: int = Query(20, ge=1, le=100)):
+    try:
+        return await leaderboard.page(metric, cursor, limit)
+    except ValueError:
+        raise StarletteHTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/users/{username}/games")
+async def match_history(username: str,
+                        before: int | None = None,
+                        limit: int = Query(20, ge=1, le=100),
+                        session: AsyncSession = Depends(get_async_session)):
+    games = await dba.select_match_history(username, before, limit, session)
+    return {"games": games, "next": games[-1]["game_id"] if len(games) == limit else None}
+
 @app.post("/create_room")
 async def create_room(input_room_name: str | None = Form(""), input_max_players: int | None = Form("")):
-    await manager.create_room(room_id=input_room_name, max_players=input_max_players, track_length=10)
+    if not await manager.create_room(room_id=input_room_name, max_players=input_max_players, track_length=10):
+        return RedirectResponse(url=f"/account/?game_error=could not create the room, try again later", status_code=302)
     return RedirectResponse(url=f"/game/{input_room_name}", status_code=302)
 
 @app.post("/token")
@@ -93,12 +158,12 @@ async def login_for_access_token(
         )
     if not username or not password:
         return wrong_data_response
-    user = auth.authenticate_user(username, password)
+    user = await auth.authenticate_user(username, password)
     if not user:
         return wrong_data_response
     access_token = auth.create_access_token(data={"sub": username})
 
-    token_max_age = int(timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES).total_seconds())
+    token_max_age = int(timedelta(minutes=auth.get_settings().ACCESS_TOKEN_EXPIRE_MINUTES).total_seconds())
     token_end_time = datetime.now().timestamp() + token_max_age
     #print(token_end_time)
 
@@ -121,6 +186,16 @@ async def login_for_access_token(
 
     return response
 
+@app.get("/metrics/db")
+def db_metrics():
+    return pool_metrics()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    if not metrics.registry.enabled:
+        raise StarletteHTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/logout")
 def logout():
     response = RedirectResponse(url="/", status_code=302)
@@ -132,61 +207,74 @@ def logout():
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     status_code = exc.status_code
     error_templates = {
+        400: "400 - Bad request.",
         401: "401 - Unauthorized.",
         403: "403 - Forbidden.",
         404: "404 - Page not found.",
+        429: "429 - Too many requests.",
         500: "500 - Internal Server Error.",
     }
     return templates.TemplateResponse(
         request=request,
         name="error.html",
         status_code=status_code,
-        context={"status_code": status_code, "detail": exc.detail, "error_message": error_templates[status_code]}
+        context={"status_code": status_code, "detail": exc.detail, "error_message": error_templates[status_code]},
+        headers=exc.headers
     )
 
 
 @app.websocket("/ws/{room_id}/{username}")
-async def websocket_endpoint(websocket: WebSocket, room_id: str, username: str):
-    await manager.connect(websocket, room_id, username)
+async def websocket_endpoint(websocket: WebSocket, room_id: str, username: str, resume: str | None = None):
+    connection = await manager.join(websocket, room_id, username, resume)
     try:
-        await manager.broadcast_to_room(f" {username} joined the room", room_id)
-        players = manager.get_room_players(room_id)
-        await manager.broadcast_to_room(f"PLAYERLIST:{','.join(players)}", room_id)
-        await manager.broadcast_ready_status(room_id)
-        await manager.broadcast_player_positions(room_id)
-
         while True:
             data = await websocket.receive_text()
-            if data == "READY_TOGGLE":
-                await manager.toggle_ready(room_id, username)
-            elif data == "ROLL_DICE":
-                await manager.handle_dice_roll(room_id, username)
-            else:
-                await manager.broadcast_to_room(f" {username}: {data}", room_id)
+            await manager.receive(room_id, username, data)
+    except WebSocketDisconnect as disconnect:
+        await manager.leave(room_id, username, connection, disconnect.code)
+
+@app.websocket("/watch/{room_id}")
+async def spectator_endpoint(websocket: WebSocket, room_id: str):
+    spectator = await manager.watch(websocket, room_id)
+    try:
+        while True:
+            # spectators only read, whatever they send is dropped
+            await websocket.receive_text()
     except WebSocketDisconnect:
-        manager.disconnect(room_id, username)
-        await manager.broadcast_to_room(f" {username} left the room", room_id)
-        players = manager.get_room_players(room_id)
-        if players:
-            await manager.broadcast_to_room(f"PLAYERLIST:{','.join(players)}", room_id)
-            await manager.broadcast_ready_status(room_id)
-            await manager.broadcast_player_positions(room_id)
+        manager.unwatch(room_id, spectator)
 
 @app.get("/game/{room_id}")
 def test_game(request: Request, user: str = Depends(auth.get_current_user), room_id: str = Path(...)):
     username = user.username
     print(f"in /game/{room_id}")
-    if room_id not in manager.room_config:
+    room = manager.get_room_info(room_id)
+    if room is None:
         print(f"Room {room_id} not found in config")
         raise StarletteHTTPException(status_code=500, detail="Room not found")
-    if len(manager.get_room_players(room_id)) == manager.room_config[room_id]["max_players"]:
-        if username not in manager.get_room_players(room_id):
-            return RedirectResponse(url=f"/account/?game_error=room is full", status_code=302)
+    if len(room["players"]) == room["max_players"]:
+        if username not in room["players"]:
+            return RedirectResponse(url=f"/game/{room_id}/watch", status_code=302)
     return templates.TemplateResponse(
         request=request,
         name="game.html",
         context={"username": username,
                  "room_id": room_id,
-                 "track_length": manager.room_config[room_id]["track_length"]
+                 "track_length": room["track_length"],
+                 "spectator": False
+        }
+    )
+
+@app.get("/game/{room_id}/watch")
+def watch_game(request: Request, user: str = Depends(auth.get_current_user), room_id: str = Path(...)):
+    room = manager.get_room_info(room_id)
+    if room is None:
+        raise StarletteHTTPException(status_code=500, detail="Room not found")
+    return templates.TemplateResponse(
+        request=request,
+        name="game.html",
+        context={"username": user.username,
+                 "room_id": room_id,
+                 "track_length": room["track_length"],
+                 "spectator": True
         }
     )
@@ -0,0 +1,75 @@
+import argparse
+from sqlmodel import Session
+from database import DB_main as dbm
+from database import transfer
+from database.database import engine, create_db_and_tables, create_sqlite_engine, create_server_engine
+
+
+def rebuild_stats(args):
+    count = dbm.rebuild_user_stats()
+    print(f"rebuilt stats for {count} users")
+
+
+def migrate(args):
+    create_db_and_tables()
+    print("tables and indexes are up to date")
+
+
+def target_engine(database_url: str | None):
+    if database_url is None:
+        return engine
+    if database_url.startswith("sqlite"):
+        return create_sqlite_engine(database_url)
+    return create_server_engine(database_url)
+
+
+def export_data(args):
+    count = transfer.export_table(target_engine(args.database_url), args.directory, args.table, args.format, args.chunk_size, log=print)
+    print(f"exported {count} {args.table} rows")
+
+
+def import_data(args):
+    bind = target_engine(args.database_url)
+    create_db_and_tables(bind)
+    count = transfer.import_table(bind, args.directory, args.table, args.format, log=print)
+    print(f"imported {count} {args.table} rows")
+    if args.table == "games" and not args.skip_stats:
+        # one GROUP BY over the imported history beats updating the stats part by part. A resumed
+        # import may find every part already done, the run that imported them may not have got here
+        with Session(bind) as session:
+            print(f"rebuilt stats for {dbm.rebuild_user_stats(session)} users")
+
+
+def add_transfer_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("directory", help="directory holding the part files")
+    parser.add_argument("--table", choices=sorted(transfer.TABLES), default="games")
+    parser.add_argument("--format", choices=transfer.FORMATS, default="csv")
+    parser.add_argument("--database-url", help="database to use instead of the configured one, e.g. to migrate between databases")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ProjektTTe maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="create missing tables and indexes")
+    migrate_parser.set_defaults(handler=migrate)
+
+    rebuild_parser = commands.add_parser("rebuild-stats", help="recompute the user_stats table from the game history")
+    rebuild_parser.set_defaults(handler=rebuild_stats)
+
+    export_parser = commands.add_parser("export", help="stream a table into chunked csv or parquet part files, resumes an interrupted export")
+    add_transfer_arguments(export_parser)
+    export_parser.add_argument("--chunk-size", type=int, default=50000, help="games or users per part file")
+    export_parser.set_defaults(handler=export_data)
+
+    import_parser = commands.add_parser("import", help="bulk load part files written by export, parts already loaded are skipped")
+    add_transfer_arguments(import_parser)
+    import_parser.add_argument("--skip-stats", action="store_true", help="do not rebuild user_stats after importing games")
+    import_parser.set_defaults(handler=import_data)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
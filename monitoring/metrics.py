@@ -0,0 +1,222 @@
+import asyncio
+import bisect
+import functools
+import inspect
+import os
+import time
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+# Plain attribute increments: everything is updated from the event loop thread, so there is
+# nothing to lock, and a disabled registry turns every update into a single attribute check.
+class CounterChild:
+    __slots__ = ("registry", "value")
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        if self.registry.enabled:
+            self.value += amount
+
+
+class HistogramChild:
+    __slots__ = ("registry", "buckets", "counts", "sum", "count", "sample_every", "calls")
+
+    def __init__(self, registry, buckets: tuple, sample_every: int):
+        self.registry = registry
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.sample_every = sample_every
+        self.calls = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def start(self) -> float | None:
+        # only every sample_every-th call is timed, the rest skip the clock entirely
+        if not self.registry.enabled:
+            return None
+        self.calls += 1
+        if self.calls % self.sample_every:
+            return None
+        return time.perf_counter()
+
+    def stop(self, started: float | None):
+        if started is not None:
+            self.observe(time.perf_counter() - started)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, registry, name: str, help: str, labels: tuple = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.children: dict[tuple, object] = {}
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.children.items():
+            lines.extend(self._render_child(format_labels(self.label_names, values), values, child))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild(self.registry)
+
+    def _render_child(self, labels, values, child):
+        return [f"{self.name}{labels} {child.value}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS, sample_every: int = 1):
+        super().__init__(registry, name, help, labels)
+        self.buckets = buckets
+        self.sample_every = sample_every
+
+    def _new_child(self):
+        return HistogramChild(self.registry, self.buckets, self.sample_every)
+
+    def _render_child(self, labels, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{self.name}_bucket{format_labels(self.label_names + ('le',), values + (le,))} {cumulative}")
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class CollectedMetric(Metric):
+    # read at scrape time, so keeping the value current costs nothing on the hot path
+    def __init__(self, registry, name: str, help: str, collect, labels: tuple = (), kind: str = "gauge"):
+        super().__init__(registry, name, help, labels)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.collect()
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        for values, sample in samples:
+            lines.append(f"{self.name}{format_labels(self.label_names, values)} {sample}")
+        return lines
+
+
+class Registry:
+    def __init__(self, enabled: bool = True, sample_every: int = 1):
+        self.enabled = enabled
+        # default sampling for histograms on per-message paths
+        self.sample_every = max(1, sample_every)
+        self.metrics: list[Metric] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(self, name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS, sample_every: int = 1) -> Histogram:
+        return self._register(Histogram(self, name, help, labels, buckets, sample_every))
+
+    def gauge(self, name: str, help: str, collect, labels: tuple = ()) -> CollectedMetric:
+        return self._register(CollectedMetric(self, name, help, collect, labels))
+
+    def collected_counter(self, name: str, help: str, collect, labels: tuple = ()) -> CollectedMetric:
+        return self._register(CollectedMetric(self, name, help, collect, labels, kind="counter"))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(
+    enabled=os.environ.get("METRICS_ENABLED", "1") not in ("0", "false", "no"),
+    sample_every=int(os.environ.get("METRICS_SAMPLE_EVERY", 8)),
+)
+
+games_started = registry.counter("tte_games_started_total", "Games started").labels()
+games_finished = registry.counter("tte_games_finished_total", "Games finished").labels()
+ws_messages = registry.counter("tte_ws_messages_total", "WebSocket messages", ("direction",))
+ws_bytes = registry.counter("tte_ws_bytes_total", "WebSocket payload bytes", ("direction",))
+ws_messages_in, ws_messages_out = ws_messages.labels("in"), ws_messages.labels("out")
+ws_bytes_in, ws_bytes_out = ws_bytes.labels("in"), ws_bytes.labels("out")
+ws_broadcast_seconds = registry.histogram(
+    "tte_ws_broadcast_seconds", "Time to fan a message out to a room", sample_every=registry.sample_every
+).labels()
+ws_send_seconds = registry.histogram(
+    "tte_ws_send_seconds", "Time to write one frame to a socket", sample_every=registry.sample_every
+).labels()
+event_seconds = registry.histogram("tte_event_seconds", "Game event handler latency", ("event",), sample_every=registry.sample_every)
+db_seconds = registry.histogram("tte_db_call_seconds", "Database call latency", ("module", "function"))
+auth_seconds = registry.histogram("tte_auth_hash_seconds", "Password hash and verify time", ("operation",), buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+loop_lag_seconds = registry.histogram("tte_event_loop_lag_seconds", "Event loop scheduling lag").labels()
+
+
+# without explicit labels the child is labelled with the module and function name
+def timed(histogram: Histogram, *labels):
+    def decorator(func):
+        child = histogram.labels(*(labels or (func.__module__.rsplit(".", 1)[-1], func.__name__)))
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = child.start()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    child.stop(started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = child.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.stop(started)
+        return wrapper
+    return decorator
+
+
+async def sample_loop_lag(interval: float = 0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        if registry.enabled:
+            loop_lag_seconds.observe(max(0.0, loop.time() - expected))
@@ -1 +1 @@
-fastapi run main.py
\ No newline at end of file
+python manage.py migrate && fastapi run main.py
\ No newline at end of file
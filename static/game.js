@@ -1,14 +1,49 @@
 const gameUsername = window.gameUsername;
 const gameRoomId = window.gameRoomId;
+// spectators get the room's events on /watch and have no seat, buttons or chat input
+const gameSpectator = window.gameSpectator;
 let isReady = false;
 
 const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
 const host = window.location.host;
-window.gameWebSocket = new WebSocket(`${protocol}//${host}/ws/${gameRoomId}/${gameUsername}`);
+const PROTOCOL_V2 = 'tte.v2';
+// the server keeps our seat for a while after a drop, the token from SESSION reclaims it
+const NO_RECONNECT_CODES = [1000, 1001, 1013];
+const MAX_RECONNECT_ATTEMPTS = 8;
+let resumeToken = null;
+let reconnectAttempts = 0;
 
-window.gameWebSocket.onmessage = function(event) {
-    const messageText = event.data;
+let readyState = {};
+let positionState = {};
 
+function connect() {
+    const resume = resumeToken ? `?resume=${encodeURIComponent(resumeToken)}` : '';
+    const path = gameSpectator ? `/watch/${gameRoomId}` : `/ws/${gameRoomId}/${gameUsername}${resume}`;
+    const socket = new WebSocket(`${protocol}//${host}${path}`, [PROTOCOL_V2]);
+    window.gameWebSocket = socket;
+    socket.onopen = function() {
+        reconnectAttempts = 0;
+    };
+    socket.onmessage = function(event) {
+        if (socket.protocol === PROTOCOL_V2) {
+            JSON.parse(event.data).forEach(handleEvent);
+        } else {
+            handleTextMessage(event.data);
+        }
+    };
+    socket.onclose = function(event) {
+        if (NO_RECONNECT_CODES.includes(event.code) || reconnectAttempts >= MAX_RECONNECT_ATTEMPTS) {
+            return;
+        }
+        const delay = Math.min(500 * 2 ** reconnectAttempts, 8000);
+        reconnectAttempts += 1;
+        setTimeout(connect, delay);
+    };
+}
+
+connect();
+
+function handleTextMessage(messageText) {
     if (messageText.startsWith('PLAYERLIST:')) {
         const players = messageText.replace('PLAYERLIST:', '').split(',');
         updatePlayerList(players);
@@ -30,10 +65,59 @@ window.gameWebSocket.onmessage = function(event) {
     }else if (messageText.startsWith('WIN:')) {
         const winner = messageText.replace('WIN:', '');
         handleWin(winner);
+    } else if (messageText.startsWith('SESSION:')) {
+        resumeToken = messageText.replace('SESSION:', '');
+    } else if (messageText.startsWith('CHAT_LINES:')) {
+        JSON.parse(messageText.replace('CHAT_LINES:', '')).forEach(displayChatMessage);
     } else {
         displayChatMessage(messageText);
     }
-};
+}
+
+// v2 frames are a list of [kind, payload] events, ready/pos carry only changed entries
+function handleEvent([kind, payload]) {
+    switch (kind) {
+        case 'players':
+            updatePlayerList(payload);
+            break;
+        case 'ready_all':
+            readyState = {};
+            // falls through
+        case 'ready':
+            Object.assign(readyState, payload);
+            updateReadyStatus(Object.entries(readyState)
+                .map(([username, ready]) => `${username}:${ready ? 'ready' : 'not_ready'}`).join(','));
+            break;
+        case 'pos_all':
+            positionState = {};
+            // falls through
+        case 'pos':
+            Object.assign(positionState, payload);
+            updatePlayerPositions(Object.entries(positionState)
+                .map(([username, position]) => `${username}:${position}`).join(','));
+            break;
+        case 'start':
+            handleGameStart(payload);
+            break;
+        case 'dice':
+            handleDiceRoll(payload);
+            break;
+        case 'turn':
+            handleTurnChange(payload);
+            break;
+        case 'win':
+            handleWin(payload);
+            break;
+        case 'session':
+            resumeToken = payload;
+            break;
+        case 'chat_lines':
+            payload.forEach(displayChatMessage);
+            break;
+        default:
+            displayChatMessage(payload);
+    }
+}
 
 function sendMessage(event) {
     event.preventDefault();
@@ -137,6 +221,10 @@ function updatePlayerPositions(positionData) {
 }
 
 function handleGameStart(firstPlayer) {
+    if (gameSpectator) {
+        handleTurnChange(firstPlayer);
+        return;
+    }
     const statusDiv = document.getElementById('game-status');
 
     if (firstPlayer === gameUsername) {
@@ -167,7 +255,10 @@ function handleDiceRoll(diceData) {
 function handleTurnChange(nextPlayer) {
     const statusDiv = document.getElementById('game-status');
 
-    if (nextPlayer === gameUsername) {
+    if (gameSpectator) {
+        statusDiv.textContent = `${nextPlayer}'s turn`;
+        statusDiv.style.color = "orange";
+    } else if (nextPlayer === gameUsername) {
         statusDiv.textContent = "YOUR TURN!";
         statusDiv.style.color = "green";
         document.getElementById('rollButton').disabled = false;
@@ -179,9 +270,11 @@ function handleTurnChange(nextPlayer) {
 }
 
 function handleWin(winner){
-    document.getElementById('readyButton').disabled = false;
-    toggleReady();
-    document.getElementById('rollButton').disabled = true;
+    if (!gameSpectator) {
+        document.getElementById('readyButton').disabled = false;
+        toggleReady();
+        document.getElementById('rollButton').disabled = true;
+    }
     document.getElementById('game-status').textContent = `winner: ${winner}`;
 }
 
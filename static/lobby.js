@@ -0,0 +1,84 @@
+const ROOMS_POLL_INTERVAL = 5000;
+let roomsPage = 1;
+let roomsTotal = 0;
+const roomsPageSize = 20;
+
+function roomsQuery() {
+    const params = new URLSearchParams({
+        prefix: document.getElementById('rooms_prefix').value.trim(),
+        open_only: document.getElementById('rooms_open_only').checked,
+        sort: document.getElementById('rooms_sort').value,
+        page: roomsPage,
+        page_size: roomsPageSize
+    });
+    return `/rooms?${params}`;
+}
+
+// the browser revalidates with If-None-Match, an unchanged lobby comes back as a 304 with no body
+async function refreshRooms() {
+    const response = await fetch(roomsQuery(), {cache: 'no-cache'});
+    if (!response.ok) {
+        return;
+    }
+    const data = await response.json();
+    roomsTotal = data.total;
+    renderRooms(data.rooms);
+    document.getElementById('rooms_page').textContent = roomsPage;
+}
+
+function renderRooms(rooms) {
+    const roomsList = document.getElementById('rooms_list');
+    roomsList.innerHTML = '';
+
+    rooms.forEach(room => {
+        const tr = document.createElement('tr');
+
+        const name = document.createElement('td');
+        name.id = room.room_id;
+        name.textContent = room.room_id;
+        tr.appendChild(name);
+
+        const players = document.createElement('td');
+        players.textContent = `${room.player_count}/${room.max_players}`;
+        tr.appendChild(players);
+
+        const join = document.createElement('td');
+        const link = document.createElement('a');
+        link.href = `/game/${encodeURIComponent(room.room_id)}`;
+        const button = document.createElement('button');
+        button.className = 'table_button';
+        button.textContent = 'join';
+        link.appendChild(button);
+        join.appendChild(link);
+        tr.appendChild(join);
+
+        roomsList.appendChild(tr);
+    });
+}
+
+function initializeLobby() {
+    const filter = document.getElementById('rooms_filter');
+    filter.addEventListener('input', () => {
+        roomsPage = 1;
+        refreshRooms();
+    });
+    filter.addEventListener('submit', event => event.preventDefault());
+
+    document.getElementById('rooms_previous').addEventListener('click', () => {
+        if (roomsPage > 1) {
+            roomsPage -= 1;
+            refreshRooms();
+        }
+    });
+    document.getElementById('rooms_next').addEventListener('click', () => {
+        if (roomsPage * roomsPageSize < roomsTotal) {
+            roomsPage += 1;
+            refreshRooms();
+        }
+    });
+
+    refreshRooms();
+    setInterval(refreshRooms, ROOMS_POLL_INTERVAL);
+}
+
+document.addEventListener('DOMContentLoaded', initializeLobby);
@@ -0,0 +1,28 @@
+import base64
+import json
+import pytest
+from database.leaderboard import decode_cursor, encode_cursor
+
+
+def cursor_of(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor({"value": 0.5, "username": "alice"})) == (0.5, "alice")
+
+
+@pytest.mark.parametrize("cursor", [
+    "NQ==",
+    cursor_of({"value": 1, "username": "alice"}),
+    cursor_of([1, "alice", "bob"]),
+    cursor_of([1]),
+    cursor_of(["1", "alice"]),
+    cursor_of([True, "alice"]),
+    cursor_of([1, 2]),
+    "not base64!",
+    cursor_of("alice"),
+])
+def test_malformed_cursor_is_a_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
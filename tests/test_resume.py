@@ -0,0 +1,58 @@
+import asyncio
+from game.outbound import OutboundQueue
+from game.websocket_handlers import ConnectionManager
+
+
+class StallingSocket:
+    def __init__(self):
+        self.sent = []
+        self.open = asyncio.Event()
+        self.open.set()
+
+    async def send_text(self, frame: str):
+        await self.open.wait()
+        self.sent.append(frame)
+
+    async def close(self, code: int | None = None):
+        pass
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def stalled_then_resumed(drop_first: bool) -> list[str]:
+    manager = ConnectionManager(reconnect_grace=5, tick=0.01, turn_timeout=0)
+    await manager.start()
+    alice_socket, bob_socket = StallingSocket(), StallingSocket()
+    alice = OutboundQueue(alice_socket)
+    await manager.add_player("room", "alice", alice)
+    await manager.add_player("room", "bob", OutboundQueue(bob_socket))
+    await settle()
+    token = alice_socket.sent[0].split(":", 1)[1]
+    # alice's socket stops taking writes, the chat is queued or stuck in send_text but never sent
+    alice_socket.open.clear()
+    await manager.handle_event("room", "bob", "first")
+    await manager.handle_event("room", "bob", "second")
+    await settle()
+    assert not any("first" in frame or "second" in frame for frame in alice_socket.sent)
+    if drop_first:
+        await manager.leave("room", "alice", alice, 1006)
+    resumed_socket = StallingSocket()
+    await manager.add_player("room", "alice", OutboundQueue(resumed_socket), token)
+    await settle()
+    await manager.stop()
+    return resumed_socket.sent
+
+
+def test_resume_replays_what_a_stalled_socket_never_sent():
+    sent = asyncio.run(stalled_then_resumed(drop_first=True))
+    assert any("first" in frame for frame in sent)
+    assert any("second" in frame for frame in sent)
+
+
+def test_early_reconnect_replays_what_the_old_socket_never_sent():
+    sent = asyncio.run(stalled_then_resumed(drop_first=False))
+    assert any("first" in frame for frame in sent)
+    assert any("second" in frame for frame in sent)
@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request, Response
+from fastapi.templating import Jinja2Templates
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# below this the compressed variant is rarely worth the extra header
+MIN_COMPRESS_SIZE = 256
+
+
+class CachedContent:
+    def __init__(self, body: bytes, media_type: str, last_modified: float):
+        self.body = body
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.etag = f'W/"{self.digest[:16]}"'
+        self.last_modified = formatdate(int(last_modified), usegmt=True)
+        self.last_modified_seconds = int(last_modified)
+        self.variants: dict[str, bytes] = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body)
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+
+    def not_modified(self, request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip() for tag in if_none_match.split(",")}
+            return "*" in tags or self.etag in tags or self.etag.removeprefix("W/") in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= self.last_modified_seconds
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        headers = {
+            "ETag": self.etag,
+            "Last-Modified": self.last_modified,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if self.not_modified(request):
+            return Response(status_code=304, headers=headers)
+        accepted = request.headers.get("accept-encoding", "")
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and encoding in accepted:
+                headers["Content-Encoding"] = encoding
+                return Response(self.variants[encoding], media_type=self.media_type, headers=headers)
+        return Response(self.body, media_type=self.media_type, headers=headers)
+
+
+class StaticAssets:
+    def __init__(self, directory: str, url_prefix: str = "/static"):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.files: dict[str, CachedContent] = {}
+        self.hashed_names: dict[str, str] = {}
+        self.loaded = False
+
+    def load(self):
+        files = {}
+        hashed_names = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                with open(path, "rb") as file:
+                    body = file.read()
+                media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                content = CachedContent(body, media_type, os.path.getmtime(path))
+                stem, extension = os.path.splitext(relative)
+                hashed = f"{stem}.{content.digest[:12]}{extension}"
+                files[relative] = content
+                files[hashed] = content
+                hashed_names[relative] = hashed
+        self.files = files
+        self.hashed_names = hashed_names
+        self.loaded = True
+
+    def url(self, name: str) -> str:
+        if not self.loaded:
+            self.load()
+        return f"{self.url_prefix}/{self.hashed_names.get(name, name)}"
+
+    def response(self, request: Request, path: str) -> Response:
+        if not self.loaded:
+            self.load()
+        content = self.files.get(path)
+        if content is None:
+            raise StarletteHTTPException(status_code=404)
+        # a hashed name can never change content, the plain name can and has to be revalidated
+        cache_control = REVALIDATE if path in self.hashed_names else IMMUTABLE
+        return content.response(request, cache_control)
+
+
+class PrerenderedPages:
+    def __init__(self, templates: Jinja2Templates, contexts: dict[str, dict]):
+        self.templates = templates
+        self.contexts = contexts
+        self.pages: dict[str, CachedContent] = {}
+
+    def render_all(self):
+        for name in self.contexts:
+            self.render(name)
+
+    def render(self, name: str):
+        body = self.templates.get_template(name).render(self.contexts[name]).encode()
+        self.pages[name] = CachedContent(body, "text/html; charset=utf-8", time.time())
+
+    def response(self, request: Request, name: str) -> Response:
+        if name not in self.pages:
+            self.render(name)
+        return self.pages[name].response(request, REVALIDATE)